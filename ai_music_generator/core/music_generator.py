@@ -2,10 +2,72 @@
 Core music generation module that combines Markov chain and rule-based approaches.
 """
 
+import glob
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
 from models.markov_model import MarkovModel
 from models.rule_based_model import RuleBasedModel
 from utils.music_theory import get_scale_notes, get_chord_progression
-from utils.midi_utils import create_midi_file, midi_to_mp3
+from utils.midi_utils import create_midi_file, create_midi_bytes, midi_to_mp3, midi_bytes_to_mp3
+
+# Uniquely named output files are deleted when there are more than
+# OUTPUT_MAX_FILES of them, or when they are older than OUTPUT_MAX_AGE seconds
+OUTPUT_MAX_FILES = 200
+OUTPUT_MAX_AGE = 24 * 60 * 60
+
+def _unique_midi_filename():
+    """Get a MIDI file name that no other generation uses."""
+    return f"generated_music_{uuid.uuid4().hex}.mid"
+
+def _prune_output(output_dir):
+    """
+    Delete old uniquely named output files.
+    
+    Keeps at most OUTPUT_MAX_FILES files, none older than OUTPUT_MAX_AGE.
+    
+    Args:
+        output_dir (str): Directory containing the generated files
+    """
+    files = []
+    for path in glob.glob(os.path.join(output_dir, 'generated_music_*')):
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            pass  # Deleted meanwhile
+    files.sort(reverse=True)
+    
+    oldest_kept = time.time() - OUTPUT_MAX_AGE
+    for k, (mtime, path) in enumerate(files):
+        if k >= OUTPUT_MAX_FILES or mtime < oldest_kept:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _convert_unique(midi_path):
+    """
+    Convert a uniquely named MIDI file to MP3 and clean up after it.
+    
+    The MIDI file is deleted once it has been converted, and old output
+    files are pruned so that the output directory doesn't grow without limit.
+    
+    Args:
+        midi_path (str): Path to the MIDI file
+    
+    Returns:
+        str: Path to the generated MP3 file, or None if the conversion failed
+    """
+    mp3_path = midi_to_mp3(midi_path)
+    if mp3_path is not None and mp3_path != midi_path:
+        try:
+            os.remove(midi_path)
+        except OSError:
+            pass
+    _prune_output(os.path.dirname(midi_path))
+    return mp3_path
 
 class MusicGenerator:
     """Main music generation class that combines different generation approaches."""
@@ -13,11 +75,18 @@ class MusicGenerator:
     def __init__(self):
         self.markov_model = MarkovModel()
         self.rule_based_model = RuleBasedModel()
+        # Background workers for the subprocess-bound MIDI to MP3 conversion
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
     
-    def generate_music(self, params):
+    def generate_music(self, params, unique=False):
         """
         Generate music based on user parameters.
         
+        By default the files are written as generated_music.mid/.mp3,
+        replacing the previous song. With unique set, each call writes its own
+        files so that concurrent callers don't collide; the MIDI file is then
+        deleted after conversion and old output is pruned.
+        
         Args:
             params (dict): Dictionary containing user parameters:
                 - genre (str): Music genre (required)
@@ -29,10 +98,73 @@ class MusicGenerator:
                 - vocals (dict): Vocals parameters (optional)
                 - complexity (str): Complexity level - Simple/Intermediate/Complex (optional, default: "Simple")
                 - mode (str): Generation mode - "markov", "rule", or "hybrid" (optional, default: "hybrid")
+            unique (bool): Write uniquely named files
         
         Returns:
             str: Path to the generated MP3 file
         """
+        if unique:
+            return _convert_unique(self._generate_midi(params, filename=_unique_midi_filename()))
+        
+        midi_path = self._generate_midi(params)
+        
+        # Convert MIDI to MP3
+        return midi_to_mp3(midi_path)
+    
+    def generate_music_async(self, params):
+        """
+        Generate music based on user parameters without waiting for the audio.
+        
+        The MIDI file is generated synchronously; the conversion to MP3 runs on
+        a background thread so that further songs can be generated meanwhile.
+        Each call writes to its own uniquely named files, as with
+        generate_music(params, unique=True).
+        
+        Args:
+            params (dict): Dictionary of user parameters, see generate_music()
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the path of the generated MP3 file
+        """
+        midi_path = self._generate_midi(params, filename=_unique_midi_filename())
+        return self._io_pool.submit(_convert_unique, midi_path)
+    
+    def generate_music_bytes(self, params):
+        """
+        Generate music based on user parameters entirely in memory.
+        
+        Args:
+            params (dict): Dictionary of user parameters, see generate_music()
+        
+        Returns:
+            bytes: MP3 data, or None if the conversion failed
+        """
+        midi_bytes = create_midi_bytes(**self._compose(params))
+        return midi_bytes_to_mp3(midi_bytes)
+    
+    def _generate_midi(self, params, filename='generated_music.mid'):
+        """
+        Generate a MIDI file based on user parameters.
+        
+        Args:
+            params (dict): Dictionary of user parameters, see generate_music()
+            filename (str): Name of the MIDI file in the output directory
+        
+        Returns:
+            str: Path to the generated MIDI file
+        """
+        return create_midi_file(filename=filename, **self._compose(params))
+    
+    def _compose(self, params):
+        """
+        Compose melody and harmony based on user parameters.
+        
+        Args:
+            params (dict): Dictionary of user parameters, see generate_music()
+        
+        Returns:
+            dict: Keyword arguments for create_midi_file() / create_midi_bytes()
+        """
         # Set default values for optional parameters
         genre = params.get('genre')
         if not genre:
@@ -68,8 +200,7 @@ class MusicGenerator:
                 mood=mood,
                 tempo=tempo
             )
-            harmony = chord_progression * (num_bars // len(chord_progression) + 1)
-            harmony = harmony[:num_bars]
+            harmony = list(islice(cycle(chord_progression), num_bars))
             
         elif mode == 'rule':
             melody, harmony = self.rule_based_model.generate_composition(
@@ -78,19 +209,13 @@ class MusicGenerator:
                 num_bars=num_bars,
                 complexity=complexity,
                 mood=mood,
-                tempo=tempo
+                tempo=tempo,
+                scale_notes=scale_notes
             )
             
         else:  # hybrid mode
-            # Use rule-based for harmony and structure
-            _, harmony = self.rule_based_model.generate_composition(
-                scale=scale,
-                chord_progression=chord_progression,
-                num_bars=num_bars,
-                complexity=complexity,
-                mood=mood,
-                tempo=tempo
-            )
+            # Use rule-based harmony and structure
+            harmony = self.rule_based_model.build_harmony(chord_progression, num_bars)
             
             # Use Markov for melody
             melody = self.markov_model.generate_melody(
@@ -102,16 +227,28 @@ class MusicGenerator:
                 tempo=tempo  # Pass tempo to influence melody generation
             )
         
-        # Create MIDI file
-        midi_path = create_midi_file(
-            melody=melody,
-            harmony=harmony,
-            instruments=instruments,
-            bpm=bpm,
-            vocals=vocals
-        )
-        
-        # Convert MIDI to MP3
-        mp3_path = midi_to_mp3(midi_path)
-        
-        return mp3_path
\ No newline at end of file
+        return {
+            'melody': melody,
+            'harmony': harmony,
+            'instruments': instruments,
+            'bpm': bpm,
+            'vocals': vocals
+        }
+
+
+# Shared generator instance, created on first use
+_singleton = None
+
+def get_generator():
+    """
+    Get the shared MusicGenerator instance.
+    
+    The models are built once and reused by every caller.
+    
+    Returns:
+        MusicGenerator: The shared generator
+    """
+    global _singleton
+    if _singleton is None:
+        _singleton = MusicGenerator()
+    return _singleton
@@ -4,6 +4,7 @@ Example script demonstrating how to use the AI Music Generator programmatically.
 """
 
 import os
+from concurrent.futures import wait
 from core.music_generator import MusicGenerator
 
 def main():
@@ -11,9 +12,13 @@ def main():
     # Create a MusicGenerator instance
     generator = MusicGenerator()
     
+    # Songs are generated one after another while earlier ones are still
+    # being converted to MP3 in the background
+    futures = []
+    
     # Example 1: Generate a simple pop song with default parameters
     print("Generating a simple pop song...")
-    mp3_path = generator.generate_music({
+    futures.append(generator.generate_music_async({
         'genre': 'Pop',
         'instruments': ['Piano'],
         'scale': 'C Major',
@@ -22,12 +27,11 @@ def main():
         'length': 'Short',
         'complexity': 'Simple',
         'mode': 'hybrid'
-    })
-    print(f"Generated music saved to: {mp3_path}")
+    }))
     
     # Example 2: Generate a complex jazz song with multiple instruments
     print("\nGenerating a complex jazz song...")
-    mp3_path = generator.generate_music({
+    futures.append(generator.generate_music_async({
         'genre': 'Jazz',
         'instruments': ['Piano', 'Bass', 'Saxophone'],
         'scale': 'D Minor',
@@ -36,12 +40,11 @@ def main():
         'length': 'Medium',
         'complexity': 'Complex',
         'mode': 'markov'
-    })
-    print(f"Generated music saved to: {mp3_path}")
+    }))
     
     # Example 3: Generate an energetic rock song using rule-based approach
     print("\nGenerating an energetic rock song...")
-    mp3_path = generator.generate_music({
+    futures.append(generator.generate_music_async({
         'genre': 'Rock',
         'instruments': ['Electric Guitar', 'Bass', 'Drums'],
         'scale': 'E Minor',
@@ -50,8 +53,12 @@ def main():
         'length': 'Medium',
         'complexity': 'Intermediate',
         'mode': 'rule'
-    })
-    print(f"Generated music saved to: {mp3_path}")
+    }))
+    
+    # Wait for all MP3 conversions to finish
+    wait(futures)
+    for future in futures:
+        print(f"Generated music saved to: {future.result()}")
     
     print("\nAll examples completed. Check the 'output' directory for the generated MP3 files.")
 
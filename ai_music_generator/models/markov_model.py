@@ -2,10 +2,62 @@
 Markov Chain model for melody generation.
 """
 
-import random
+import sys
 import numpy as np
 from utils.music_theory import note_to_midi, midi_to_note
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# Shared random generator used for sampling melodies
+rng = np.random.default_rng()
+
+
+def _normalize_rows(matrix):
+    """
+    Normalize each row of a matrix in place so that it sums to 1.
+    
+    Rows summing to zero are left unchanged.
+    
+    Args:
+        matrix (numpy.ndarray): Matrix to normalize
+        
+    Returns:
+        numpy.ndarray: The normalized matrix
+    """
+    sums = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, sums, out=matrix, where=sums > 0)
+
+
+@njit(cache=True)
+def _walk(cdf, U, start, out):
+    """
+    Run the Markov random walk for one bar.
+    
+    Args:
+        cdf (numpy.ndarray): Cumulative transition probabilities (8x8)
+        U (numpy.ndarray): Uniform random numbers, one per note
+        start (int): Scale degree the walk starts from
+        out (numpy.ndarray): Receives the sampled scale degree for each note
+        
+    Returns:
+        int: The last sampled scale degree
+    """
+    cur = start
+    last = cdf.shape[1] - 1
+    for t in range(U.shape[0]):
+        row = cdf[cur]
+        cur = min(np.searchsorted(row, U[t] * row[last], 'right'), last)
+        out[t] = cur
+    return cur
+
+
 class MarkovModel:
     """
     Markov Chain model for melody generation.
@@ -14,21 +66,56 @@ class MarkovModel:
     probabilities of note transitions.
     """
     
+    # Notes per bar for each (tempo, complexity) combination
+    _NOTES_PER_BAR = {
+        ('Slow', 'Simple'): 2,  # Fewer notes for slow tempo
+        ('Slow', 'Intermediate'): 4,
+        ('Slow', 'Complex'): 8,
+        ('Medium', 'Simple'): 4,
+        ('Medium', 'Intermediate'): 8,
+        ('Medium', 'Complex'): 12,
+        ('Fast', 'Simple'): 8,  # More notes for fast tempo
+        ('Fast', 'Intermediate'): 12,
+        ('Fast', 'Complex'): 16,
+    }
+    
+    # Candidate note durations for each (tempo, complexity) combination
+    _DURATION_POOLS = {
+        ('Slow', 'Simple'): (0.5, 0.25),  # Longer notes for slow tempo
+        ('Slow', 'Intermediate'): (0.25, 0.5),
+        ('Slow', 'Complex'): (0.125, 0.25, 0.5),
+        ('Medium', 'Simple'): (0.25,),
+        ('Medium', 'Intermediate'): (0.125, 0.25),
+        ('Medium', 'Complex'): (0.0625, 0.125, 0.25),
+        ('Fast', 'Simple'): (0.125, 0.25),  # Shorter notes for fast tempo
+        ('Fast', 'Intermediate'): (0.0625, 0.125, 0.25),
+        ('Fast', 'Complex'): (0.0625, 0.125),
+    }
+    
     def __init__(self):
-        # Pre-defined transition matrices for different genres and moods
-        self.transition_matrices = self._initialize_transition_matrices()
+        # Pre-defined transition matrices for different genres and moods,
+        # stacked into one contiguous (K, 8, 8) bank indexed by (genre, mood)
+        matrices = self._initialize_transition_matrices()
+        self._matrix_keys = {key: i for i, key in enumerate(matrices)}
+        self._matrix_bank = np.stack(list(matrices.values())).astype(np.float32)
+        self._matrix_bank.flags.writeable = False
+        # Fully adjusted matrices keyed by (bank index, complexity, tempo)
+        self._matrix_cache = {}
         
     def _initialize_transition_matrices(self):
         """
         Initialize transition matrices for different genres and moods.
         
+        The probabilities are stored as float32; they are hand-tuned and need
+        no more precision than that.
+        
         Returns:
             dict: Dictionary of transition matrices
         """
         matrices = {}
         
         # Example: Pop genre, Happy mood
-        matrices[('Pop', 'Happy')] = np.array([
+        matrices[('Pop', 'Happy')] = np.asarray([
             [0.10, 0.15, 0.30, 0.00, 0.25, 0.00, 0.00, 0.20],
             [0.20, 0.05, 0.40, 0.10, 0.15, 0.05, 0.05, 0.00],
             [0.15, 0.10, 0.05, 0.25, 0.30, 0.10, 0.05, 0.00],
@@ -37,10 +124,10 @@ class MarkovModel:
             [0.10, 0.20, 0.10, 0.15, 0.25, 0.05, 0.15, 0.00],
             [0.40, 0.05, 0.05, 0.10, 0.10, 0.10, 0.05, 0.15],
             [0.50, 0.10, 0.10, 0.05, 0.15, 0.05, 0.05, 0.00],
-        ])
+        ], dtype=np.float32)
         
         # Pop genre, Sad mood
-        matrices[('Pop', 'Sad')] = np.array([
+        matrices[('Pop', 'Sad')] = np.asarray([
             [0.15, 0.10, 0.05, 0.25, 0.10, 0.20, 0.10, 0.05],  # From scale degree 1
             [0.20, 0.10, 0.15, 0.30, 0.05, 0.15, 0.05, 0.00],  # From scale degree 2
             [0.10, 0.20, 0.10, 0.15, 0.10, 0.25, 0.10, 0.00],  # From scale degree 3
@@ -49,10 +136,10 @@ class MarkovModel:
             [0.15, 0.20, 0.10, 0.10, 0.15, 0.10, 0.20, 0.00],  # From scale degree 6
             [0.30, 0.10, 0.05, 0.15, 0.10, 0.20, 0.05, 0.05],  # From scale degree 7
             [0.40, 0.15, 0.10, 0.10, 0.15, 0.05, 0.05, 0.00],  # From scale degree 8 (octave)
-        ])
+        ], dtype=np.float32)
         
          # Classical genre, Calm mood
-        matrices[('Classical', 'Calm')] = np.array([
+        matrices[('Classical', 'Calm')] = np.asarray([
             [0.15, 0.25, 0.15, 0.10, 0.20, 0.05, 0.05, 0.05],  # From scale degree 1
             [0.20, 0.10, 0.25, 0.15, 0.10, 0.15, 0.05, 0.00],  # From scale degree 2
             [0.15, 0.20, 0.10, 0.25, 0.15, 0.10, 0.05, 0.00],  # From scale degree 3
@@ -61,10 +148,10 @@ class MarkovModel:
             [0.15, 0.25, 0.15, 0.10, 0.20, 0.05, 0.10, 0.00],  # From scale degree 6
             [0.30, 0.15, 0.05, 0.10, 0.15, 0.15, 0.05, 0.05],  # From scale degree 7
             [0.35, 0.20, 0.15, 0.05, 0.15, 0.05, 0.05, 0.00],  # From scale degree 8 (octave)
-        ])
+        ], dtype=np.float32)
         
        # Rock genre, Energetic mood
-        matrices[('Rock', 'Energetic')] = np.array([
+        matrices[('Rock', 'Energetic')] = np.asarray([
             [0.05, 0.10, 0.15, 0.05, 0.35, 0.05, 0.15, 0.10],  # From scale degree 1
             [0.15, 0.05, 0.20, 0.15, 0.25, 0.10, 0.10, 0.00],  # From scale degree 2
             [0.10, 0.15, 0.05, 0.10, 0.30, 0.15, 0.15, 0.00],  # From scale degree 3
@@ -73,10 +160,10 @@ class MarkovModel:
             [0.10, 0.15, 0.20, 0.15, 0.20, 0.05, 0.15, 0.00],  # From scale degree 6
             [0.35, 0.10, 0.10, 0.05, 0.20, 0.10, 0.05, 0.05],  # From scale degree 7
             [0.40, 0.15, 0.10, 0.05, 0.20, 0.05, 0.05, 0.00],  # From scale degree 8 (octave)
-        ]) 
+        ], dtype=np.float32)
         
         # ... (other matrices unchanged) ...
-        matrices['default'] = np.array([
+        matrices['default'] = np.asarray([
             [0.10, 0.15, 0.20, 0.10, 0.20, 0.10, 0.05, 0.10],
             [0.20, 0.05, 0.25, 0.15, 0.15, 0.15, 0.05, 0.00],
             [0.15, 0.15, 0.05, 0.20, 0.25, 0.15, 0.05, 0.00],
@@ -85,146 +172,136 @@ class MarkovModel:
             [0.15, 0.20, 0.15, 0.15, 0.20, 0.05, 0.10, 0.00],
             [0.35, 0.10, 0.05, 0.10, 0.15, 0.15, 0.05, 0.05],
             [0.40, 0.15, 0.15, 0.05, 0.15, 0.05, 0.05, 0.00],
-        ])
+        ], dtype=np.float32)
         return matrices
 
-    def _get_transition_matrix(self, genre, mood):
-        key = (genre, mood)
-        if key in self.transition_matrices:
-            return self.transition_matrices[key]
-        for k in self.transition_matrices:
-            if isinstance(k, tuple) and k[0] == genre:
-                return self.transition_matrices[k]
-        return self.transition_matrices['default']
+    def _get_matrix_index(self, genre, mood):
+        index = self._matrix_keys.get((genre, mood))
+        if index is None:
+            index = next((i for k, i in self._matrix_keys.items()
+                          if isinstance(k, tuple) and k[0] == genre),
+                         self._matrix_keys['default'])
+        return index
 
     def _adjust_for_complexity(self, matrix, complexity):
         if complexity == 'Simple':
+            # Favour chord tones (degrees 1, 3, 5), taking the extra weight
+            # proportionally from the remaining degrees
+            cols = np.array([0, 2, 4])
+            other = np.setdiff1d(np.arange(8), cols)
             adjusted = matrix.copy()
-            for i in range(8):
-                total_increase = 0
-                for j in [0, 2, 4]:
-                    increase = min(0.1, 1.0 - adjusted[i, j])
-                    adjusted[i, j] += increase
-                    total_increase += increase
-                if total_increase > 0:
-                    other = [j for j in range(8) if j not in [0, 2, 4]]
-                    total_other = sum(adjusted[i, j] for j in other)
-                    if total_other > 0:
-                        for j in other:
-                            adjusted[i, j] -= (adjusted[i, j] / total_other) * total_increase
-            for i in range(8):
-                adjusted[i] /= adjusted[i].sum()
+            increase = np.clip(1.0 - adjusted[:, cols], 0, 0.1)
+            adjusted[:, cols] += increase
+            total_increase = increase.sum(axis=1, keepdims=True)
+            other_totals = adjusted[:, other].sum(axis=1, keepdims=True)
+            adjusted[:, other] -= adjusted[:, other] * (total_increase / np.where(other_totals > 0, other_totals, 1.0))
+            _normalize_rows(adjusted)
             return adjusted
         elif complexity == 'Complex':
-            adjusted = matrix.copy()
-            for i in range(8):
-                for j in range(8):
-                    adjusted[i, j] = 0.7 * adjusted[i, j] + 0.3 * (1/8)
-            for i in range(8):
-                adjusted[i] /= adjusted[i].sum()
+            # Blend towards a uniform distribution for more varied melodies
+            adjusted = 0.7 * matrix + 0.3 / 8
+            _normalize_rows(adjusted)
             return adjusted
         else:
             return matrix
 
+    def _build_matrix(self, genre, mood, complexity, tempo):
+        """
+        Get the transition matrix adjusted for complexity and tempo.
+
+        The result only depends on its arguments, so it is computed once per
+        parameter combination and cached. The cache is keyed by the values
+        the arguments resolve to, so unknown values share the entry they fall
+        back to and the cache stays bounded.
+
+        Returns:
+            numpy.ndarray: Row-normalized 8x8 transition matrix
+        """
+        index = self._get_matrix_index(genre, mood)
+        complexity = complexity if complexity in ('Simple', 'Complex') else 'Intermediate'
+        tempo = tempo if tempo in ('Slow', 'Fast') else 'Medium'
+        key = (index, complexity, tempo)
+        matrix = self._matrix_cache.get(key)
+        if matrix is not None:
+            return matrix
+
+        matrix = self._adjust_for_complexity(self._matrix_bank[index], complexity)
+
+        # Adjust the transition matrix based on tempo
+        distance = np.abs(np.arange(8)[:, None] - np.arange(8)[None, :])
+        if tempo == 'Fast':
+            # For fast tempo, increase probability of jumps of 3 or more steps
+            matrix = np.where(distance >= 3, matrix * 1.5, matrix)
+            _normalize_rows(matrix)
+        elif tempo == 'Slow':
+            # For slow tempo, increase probability of steps of 2 or less
+            matrix = np.where(distance <= 2, matrix * 1.5, matrix)
+            _normalize_rows(matrix)
+
+        # Clamp once here so the per-bar samplers can use the rows as they are
+        matrix = np.clip(matrix, 0, None)
+        self._matrix_cache[key] = matrix
+        return matrix
+
     def generate_melody(self, scale_notes, num_bars, complexity='Simple', mood='Neutral', genre='Pop', chord_progression=None, tempo='Medium'):
-        matrix = self._get_transition_matrix(genre, mood)
-        matrix = self._adjust_for_complexity(matrix, complexity)
-        
-        # Adjust notes per bar based on tempo and complexity
-        if tempo == 'Slow':
-            if complexity == 'Simple':
-                notes_per_bar = 2  # Fewer notes for slow tempo
-            elif complexity == 'Intermediate':
-                notes_per_bar = 4
-            else:
-                notes_per_bar = 8
-        elif tempo == 'Fast':
-            if complexity == 'Simple':
-                notes_per_bar = 8  # More notes for fast tempo
-            elif complexity == 'Intermediate':
-                notes_per_bar = 12
-            else:
-                notes_per_bar = 16
-        else:  # Medium tempo
-            if complexity == 'Simple':
-                notes_per_bar = 4
-            elif complexity == 'Intermediate':
-                notes_per_bar = 8
+        matrix = self._build_matrix(genre, mood, complexity, tempo)
+        
+        # Look up notes per bar and note durations based on tempo and complexity
+        # (unknown values fall back to Medium tempo / Complex rhythms)
+        tempo_key = tempo if tempo in ('Slow', 'Fast') else 'Medium'
+        complexity_key = complexity if complexity in ('Simple', 'Intermediate') else 'Complex'
+        notes_per_bar = self._NOTES_PER_BAR[(tempo_key, complexity_key)]
+        duration_pool = self._DURATION_POOLS[(tempo_key, complexity_key)]
+        
+        # Note name for each of the 8 scale degrees (the 8th wraps to the next
+        # octave), using the octave carried by the scale note itself
+        degree_names = []
+        for degree in range(8):
+            note = scale_notes[degree % len(scale_notes)]
+            if note[-1].isdigit():
+                note_name, base_octave = note[:-1], int(note[-1])
             else:
-                notes_per_bar = 12
+                note_name, base_octave = note, 4
+            octave = base_octave + (degree // len(scale_notes))
+            degree_names.append(sys.intern(f"{note_name}{octave}"))
         
         current_degree = 0
-        melody = []
+        degrees = np.empty(notes_per_bar, dtype=np.int64)
+        U = np.empty(notes_per_bar, dtype=np.float32)
+        melody = [None] * (num_bars * notes_per_bar)
+        idx = 0
         
-        # Adjust the transition matrix based on tempo
-        if tempo == 'Fast':
-            # For fast tempo, increase probability of larger jumps
-            for i in range(8):
-                for j in range(8):
-                    # Increase probability of jumps of 3 or more steps
-                    if abs(i - j) >= 3:
-                        matrix[i, j] *= 1.5
-                # Renormalize
-                matrix[i] /= matrix[i].sum()
-        elif tempo == 'Slow':
-            # For slow tempo, increase probability of smaller steps
-            for i in range(8):
-                for j in range(8):
-                    # Increase probability of steps of 2 or less
-                    if abs(i - j) <= 2:
-                        matrix[i, j] *= 1.5
-                # Renormalize
-                matrix[i] /= matrix[i].sum()
+        # Cumulative transition probabilities, keyed by which scale degrees
+        # are chord tones in the current bar
+        scale_degrees = scale_notes[:8]
+        scale_set = frozenset(scale_degrees)
+        base_cdf = matrix.cumsum(axis=1)
+        bar_cache = {}
         
         for bar in range(num_bars):
             if chord_progression and bar < len(chord_progression):
-                chord_notes = [note for note in chord_progression[bar].split() if note in scale_notes]
-                temp_matrix = matrix.copy()
-                for i in range(8):
-                    for j, note in enumerate(scale_notes):
-                        if note in chord_notes:
-                            temp_matrix[i, j] *= 1.5
-                    temp_matrix[i] /= temp_matrix[i].sum()
+                chord_set = frozenset(chord_progression[bar].split()) & scale_set
+                mask = np.fromiter((note in chord_set for note in scale_degrees),
+                                   dtype=bool, count=len(scale_degrees))
+                key = mask.tobytes()
+                cdf = bar_cache.get(key)
+                if cdf is None:
+                    weights = np.ones(8, dtype=np.float32)
+                    weights[:len(mask)] = np.where(mask, 1.5, 1.0)
+                    temp_matrix = matrix * weights
+                    _normalize_rows(temp_matrix)
+                    cdf = temp_matrix.cumsum(axis=1, out=temp_matrix)
+                    bar_cache[key] = cdf
             else:
-                temp_matrix = matrix
+                cdf = base_cdf
             
-            for _ in range(notes_per_bar):
-                # Safely sample next note: clip negatives and renormalize
-                row = temp_matrix[current_degree].copy()
-                row = np.clip(row, 0, None)
-                total = row.sum()
-                if total <= 0:
-                    row = np.ones_like(row) / len(row)
-                else:
-                    row = row / total
-                next_degree = np.random.choice(len(row), p=row)
-
-                # Adjust note durations based on tempo
-                if tempo == 'Slow':
-                    if complexity == 'Simple':
-                        duration = random.choice([0.5, 0.25])  # Longer notes for slow tempo
-                    elif complexity == 'Intermediate':
-                        duration = random.choice([0.25, 0.5])
-                    else:
-                        duration = random.choice([0.125, 0.25, 0.5])
-                elif tempo == 'Fast':
-                    if complexity == 'Simple':
-                        duration = random.choice([0.125, 0.25])  # Shorter notes for fast tempo
-                    elif complexity == 'Intermediate':
-                        duration = random.choice([0.0625, 0.125, 0.25])
-                    else:
-                        duration = random.choice([0.0625, 0.125])
-                else:  # Medium tempo
-                    if complexity == 'Simple':
-                        duration = 0.25
-                    elif complexity == 'Intermediate':
-                        duration = random.choice([0.125, 0.25])
-                    else:
-                        duration = random.choice([0.0625, 0.125, 0.25])
-
-                note = scale_notes[next_degree % len(scale_notes)]
-                octave = 4 + (next_degree // len(scale_notes))
-                melody.append((f"{note}{octave}", duration))
-                current_degree = next_degree % 8
+            # Draw all the random numbers for this bar at once, then walk the
+            # chain by searching the cumulative row of the current degree
+            rng.random(dtype=np.float32, out=U)
+            duration_idx = rng.integers(len(duration_pool), size=notes_per_bar)
+            current_degree = _walk(cdf, U, current_degree, degrees)
+            for t in range(notes_per_bar):
+                melody[idx] = (degree_names[degrees[t]], duration_pool[duration_idx[t]])
+                idx += 1
         
         return melody
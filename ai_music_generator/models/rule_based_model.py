@@ -3,6 +3,8 @@ Rule-based model for music generation using music theory principles.
 """
 
 import random
+import sys
+from itertools import cycle, islice
 from utils.music_theory import get_scale_notes, get_chord_notes, note_to_midi, midi_to_note
 
 class RuleBasedModel:
@@ -12,6 +14,44 @@ class RuleBasedModel:
     This model applies music theory rules to generate melodies and harmonies.
     """
     
+    # Tempo-specific rhythm patterns, used in preference to the defaults
+    _TEMPO_PATTERNS = {
+        'Slow': {
+            'Simple': [
+                [0.5, 0.5],  # Two half notes
+                [0.75, 0.25],  # Dotted half + quarter
+                [0.5, 0.25, 0.25],  # Half + two quarters
+            ],
+            'Intermediate': [
+                [0.5, 0.25, 0.25, 0.5],  # Half + two quarters + half
+                [0.25, 0.5, 0.25, 0.5],  # Quarter + half + quarter + half
+                [0.5, 0.5, 0.25, 0.25],  # Two halves + two quarters
+            ],
+            'Complex': [
+                [0.25, 0.25, 0.5, 0.25, 0.25, 0.5],  # More varied rhythm
+                [0.5, 0.125, 0.125, 0.25, 0.5, 0.25],  # Mix of durations
+                [0.375, 0.125, 0.25, 0.25, 0.5, 0.25],  # Complex rhythm
+            ]
+        },
+        'Fast': {
+            'Simple': [
+                [0.125, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125],  # Eight eighth notes
+                [0.125, 0.125, 0.25, 0.125, 0.125, 0.25],  # Faster rhythm
+                [0.25, 0.125, 0.125, 0.25, 0.25],  # Mix of quarters and eighths
+            ],
+            'Intermediate': [
+                [0.0625, 0.0625, 0.125, 0.125, 0.0625, 0.0625, 0.125, 0.125, 0.25],  # Very fast
+                [0.125, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125],  # Fast with variations
+                [0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125, 0.125],  # Sixteenths and eighths
+            ],
+            'Complex': [
+                [0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125],  # Very complex
+                [0.0625, 0.03125, 0.03125, 0.0625, 0.0625, 0.125, 0.0625, 0.0625, 0.125, 0.125, 0.125],  # Extremely varied
+                [0.125, 0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.0625, 0.0625, 0.125, 0.125],  # Fast complex rhythm
+            ]
+        }
+    }
+    
     def __init__(self):
         # Define common chord progressions for different genres
         self.chord_progressions = {
@@ -88,6 +128,12 @@ class RuleBasedModel:
                 [0, 2, 4, 5, 7, 9, 11, 12],  # Major scale
             ],
         }
+        
+        # Interned note strings keyed by (note_name, octave)
+        self._note_names = {}
+        
+        # Scale indices of each chord's notes keyed by (scale, chord)
+        self._chord_idx_cache = {}
     
     def _get_chord_progression_for_genre(self, genre):
         """
@@ -105,114 +151,144 @@ class RuleBasedModel:
             # Default to pop progression if genre not found
             return random.choice(self.chord_progressions['Pop'])
     
-    def _get_rhythm_pattern(self, complexity, tempo='Medium'):
+    def _get_rhythm_pattern(self, complexity, tempo='Medium', rng=random):
         """
         Get a rhythm pattern for the specified complexity level and tempo.
         
         Args:
             complexity (str): Complexity level - Simple/Intermediate/Complex
             tempo (str): Tempo - Slow/Medium/Fast
+            rng (random.Random, optional): Random source to choose with
             
         Returns:
             list: List of note durations
         """
-        # Define tempo-specific rhythm patterns
-        tempo_patterns = {
-            'Slow': {
-                'Simple': [
-                    [0.5, 0.5],  # Two half notes
-                    [0.75, 0.25],  # Dotted half + quarter
-                    [0.5, 0.25, 0.25],  # Half + two quarters
-                ],
-                'Intermediate': [
-                    [0.5, 0.25, 0.25, 0.5],  # Half + two quarters + half
-                    [0.25, 0.5, 0.25, 0.5],  # Quarter + half + quarter + half
-                    [0.5, 0.5, 0.25, 0.25],  # Two halves + two quarters
-                ],
-                'Complex': [
-                    [0.25, 0.25, 0.5, 0.25, 0.25, 0.5],  # More varied rhythm
-                    [0.5, 0.125, 0.125, 0.25, 0.5, 0.25],  # Mix of durations
-                    [0.375, 0.125, 0.25, 0.25, 0.5, 0.25],  # Complex rhythm
-                ]
-            },
-            'Fast': {
-                'Simple': [
-                    [0.125, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125],  # Eight eighth notes
-                    [0.125, 0.125, 0.25, 0.125, 0.125, 0.25],  # Faster rhythm
-                    [0.25, 0.125, 0.125, 0.25, 0.25],  # Mix of quarters and eighths
-                ],
-                'Intermediate': [
-                    [0.0625, 0.0625, 0.125, 0.125, 0.0625, 0.0625, 0.125, 0.125, 0.25],  # Very fast
-                    [0.125, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125, 0.125, 0.125],  # Fast with variations
-                    [0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125, 0.125],  # Sixteenths and eighths
-                ],
-                'Complex': [
-                    [0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.125, 0.125, 0.125],  # Very complex
-                    [0.0625, 0.03125, 0.03125, 0.0625, 0.0625, 0.125, 0.0625, 0.0625, 0.125, 0.125, 0.125],  # Extremely varied
-                    [0.125, 0.0625, 0.0625, 0.0625, 0.0625, 0.125, 0.0625, 0.0625, 0.125, 0.125],  # Fast complex rhythm
-                ]
-            }
-        }
-        
-        # If we have a specific tempo pattern, use it
-        if tempo in tempo_patterns and complexity in tempo_patterns[tempo]:
-            return random.choice(tempo_patterns[tempo][complexity])
-        
-        # Otherwise fall back to the default patterns
-        if complexity in self.rhythm_patterns:
-            return random.choice(self.rhythm_patterns[complexity])
-        else:
-            # Default to simple rhythm if complexity not found
-            return random.choice(self.rhythm_patterns['Simple'])
+        patterns = (self._TEMPO_PATTERNS.get(tempo, {}).get(complexity)
+                    or self.rhythm_patterns.get(complexity)
+                    # Default to simple rhythm if complexity not found
+                    or self.rhythm_patterns['Simple'])
+        return rng.choice(patterns)
     
-    def _get_melodic_pattern(self, mood):
+    def _get_melodic_pattern(self, mood, rng=random):
         """
         Get a melodic pattern for the specified mood.
         
         Args:
             mood (str): Mood/theme
+            rng (random.Random, optional): Random source to choose with
             
         Returns:
             list: List of relative note positions
         """
         if mood in self.melodic_patterns:
-            return random.choice(self.melodic_patterns[mood])
+            return rng.choice(self.melodic_patterns[mood])
         else:
             # Default to neutral mood if mood not found
-            return random.choice(self.melodic_patterns['Neutral'])
+            return rng.choice(self.melodic_patterns['Neutral'])
     
-    def _apply_melodic_pattern(self, pattern, scale_notes, start_note_idx):
+    def _get_chord_indices(self, scale, chord, scale_notes):
+        """
+        Get the indices of the scale notes that belong to a chord.
+        
+        Args:
+            scale (str): Musical scale/key (e.g., "C Major")
+            chord (str): Chord symbol or chord name
+            scale_notes (list): List of notes in the scale
+            
+        Returns:
+            tuple: Indices into scale_notes
+        """
+        key = (scale, chord, tuple(scale_notes))
+        indices = self._chord_idx_cache.get(key)
+        if indices is None:
+            chord_notes = frozenset(get_chord_notes(chord, scale))
+            indices = tuple(i for i, note in enumerate(scale_notes) if note in chord_notes)
+            self._chord_idx_cache[key] = indices
+        return indices
+    
+    def _parse_scale_notes(self, scale_notes):
+        """
+        Split scale notes into parallel lists of note names and octaves.
+        
+        Args:
+            scale_notes (list): List of notes in the scale (e.g., ['C4', 'D4'])
+            
+        Returns:
+            tuple: (note_names, base_octaves)
+        """
+        note_names = []
+        base_octaves = []
+        for note in scale_notes:
+            if note[-1].isdigit():
+                note_names.append(note[:-1])
+                base_octaves.append(int(note[-1]))
+            else:
+                note_names.append(note)
+                base_octaves.append(4)  # Default octave
+        return note_names, base_octaves
+    
+    def _apply_melodic_pattern(self, pattern, note_names, base_octaves, start_note_idx):
         """
         Apply a melodic pattern starting from a specific note in the scale.
         
         Args:
             pattern (list): List of relative note positions
-            scale_notes (list): List of notes in the scale
+            note_names (list): Note names of the scale, without octave
+            base_octaves (list): Octave of each scale note
             start_note_idx (int): Index of the starting note in the scale
             
         Returns:
             list: List of notes
         """
+        num_notes = len(note_names)
+        names = self._note_names
         notes = []
         for offset in pattern:
-            idx = (start_note_idx + offset) % len(scale_notes)
-            octave_shift = (start_note_idx + offset) // len(scale_notes)
-            note = scale_notes[idx]
-            # Extract the note name and current octave
-            if note[-1].isdigit():
-                note_name = note[:-1]
-                base_octave = int(note[-1])
-            else:
-                note_name = note
-                base_octave = 4  # Default octave
-            
-            # Apply octave shift
-            new_octave = base_octave + octave_shift
-            notes.append(f"{note_name}{new_octave}")
+            octave_shift, idx = divmod(start_note_idx + offset, num_notes)
+            key = (note_names[idx], base_octaves[idx] + octave_shift)
+            name = names.get(key)
+            if name is None:
+                name = names[key] = sys.intern(f"{key[0]}{key[1]}")
+            notes.append(name)
         
         return notes
     
-    def generate_composition(self, scale, chord_progression, num_bars, complexity='Simple', mood='Neutral', tempo='Medium'):
+    def _generate_bar(self, chord_indices, note_names, base_octaves, complexity, mood, tempo, rng):
+        """
+        Generate the melody for a single bar.
+        
+        Args:
+            chord_indices (tuple): Indices of the scale notes that are in the bar's chord
+            note_names (list): Note names of the scale, without octave
+            base_octaves (list): Octave of each scale note
+            complexity (str): Complexity level - Simple/Intermediate/Complex
+            mood (str): Mood/theme
+            tempo (str): Tempo - Slow/Medium/Fast
+            rng (random.Random): Random source for this bar
+            
+        Returns:
+            list: List of (note, duration) tuples
+        """
+        # Choose a rhythm pattern based on complexity and tempo
+        rhythm = self._get_rhythm_pattern(complexity, tempo, rng)
+        
+        # Choose a melodic pattern based on mood
+        melodic_pattern = self._get_melodic_pattern(mood, rng)
+        
+        # Determine starting note (prefer chord tones)
+        if chord_indices:
+            start_note_idx = rng.choice(chord_indices)
+        else:
+            start_note_idx = rng.randint(0, len(note_names) - 1)
+        
+        # Apply melodic pattern
+        notes = self._apply_melodic_pattern(melodic_pattern, note_names, base_octaves, start_note_idx)
+        
+        # Combine notes with rhythm
+        # If we have more notes than rhythm values, repeat the rhythm pattern
+        return list(zip(notes, cycle(rhythm)))
+    
+    def generate_composition(self, scale, chord_progression, num_bars, complexity='Simple', mood='Neutral', tempo='Medium', scale_notes=None):
         """
         Generate a composition using rule-based approach.
         
@@ -223,47 +299,60 @@ class RuleBasedModel:
             complexity (str): Complexity level - Simple/Intermediate/Complex
             mood (str): Mood/theme
             tempo (str): Tempo - Slow/Medium/Fast
+            scale_notes (list, optional): Precomputed notes of the scale
             
         Returns:
             tuple: (melody, harmony) where melody is a list of (note, duration) tuples
                   and harmony is a list of chord names
         """
-        # Get scale notes
-        scale_notes = get_scale_notes(scale)
-        
-        # Extend chord progression to cover all bars
-        extended_progression = chord_progression * (num_bars // len(chord_progression) + 1)
-        harmony = extended_progression[:num_bars]
+        harmony = self.build_harmony(chord_progression, num_bars)
+        melody = self._build_melody_from_harmony(scale, harmony, complexity, mood, tempo, scale_notes)
         
-        # Generate melody
-        melody = []
+        return melody, harmony
+    
+    def build_harmony(self, chord_progression, num_bars):
+        """
+        Extend a chord progression to cover all bars.
         
-        for bar, chord in enumerate(harmony):
-            # Get chord notes
-            chord_notes = get_chord_notes(chord, scale)
-            
-            # Choose a rhythm pattern based on complexity and tempo
-            rhythm = self._get_rhythm_pattern(complexity, tempo)
-            
-            # Choose a melodic pattern based on mood
-            melodic_pattern = self._get_melodic_pattern(mood)
-            
-            # Determine starting note (prefer chord tones)
-            chord_indices = [i for i, note in enumerate(scale_notes) if note in chord_notes]
-            if chord_indices:
-                start_note_idx = random.choice(chord_indices)
-            else:
-                start_note_idx = random.randint(0, len(scale_notes) - 1)
-            
-            # Apply melodic pattern
-            notes = self._apply_melodic_pattern(melodic_pattern, scale_notes, start_note_idx)
+        Args:
+            chord_progression (list): List of chord symbols or chord names
+            num_bars (int): Number of bars to generate
             
-            # Combine notes with rhythm
-            # If we have more notes than rhythm values, repeat the rhythm pattern
-            extended_rhythm = rhythm * (len(notes) // len(rhythm) + 1)
-            extended_rhythm = extended_rhythm[:len(notes)]
+        Returns:
+            list: Chord name for each bar
+        """
+        return list(islice(cycle(chord_progression), num_bars))
+    
+    def _build_melody_from_harmony(self, scale, harmony, complexity, mood, tempo, scale_notes=None):
+        """
+        Generate a melody over a given harmony.
+        
+        Args:
+            scale (str): Musical scale/key (e.g., "C Major")
+            harmony (list): Chord name for each bar
+            complexity (str): Complexity level - Simple/Intermediate/Complex
+            mood (str): Mood/theme
+            tempo (str): Tempo - Slow/Medium/Fast
+            scale_notes (list, optional): Precomputed notes of the scale
             
-            for note, duration in zip(notes, extended_rhythm):
-                melody.append((note, duration))
+        Returns:
+            list: List of (note, duration) tuples
+        """
+        # Get scale notes
+        if scale_notes is None:
+            scale_notes = get_scale_notes(scale)
+        note_names, base_octaves = self._parse_scale_notes(scale_notes)
+        
+        # Progressions repeat, so look up the chord tones in the scale once
+        # per distinct chord rather than once per bar
+        chord_indices = {chord: self._get_chord_indices(scale, chord, scale_notes)
+                         for chord in set(harmony)}
+        
+        # Each bar gets its own random generator seeded from the shared one
+        seed = random.getrandbits(32)
         
-        return melody, harmony
\ No newline at end of file
+        melody = []
+        for bar, chord in enumerate(harmony):
+            melody.extend(self._generate_bar(chord_indices[chord], note_names, base_octaves,
+                                             complexity, mood, tempo, random.Random(seed + bar)))
+        return melody
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Tests for the MIDI utilities.
+
+Run from the ai_music_generator directory with:
+    python -m unittest discover tests
+"""
+
+import io
+import random
+import unittest
+import mido
+from core.music_generator import MusicGenerator
+from utils.midi_utils import create_midi_bytes
+
+
+def _note_ons(midi_bytes):
+    """Get the (channel, note) of every note-on in MIDI file data."""
+    midi = mido.MidiFile(file=io.BytesIO(midi_bytes))
+    return [(msg.channel, msg.note) for track in midi.tracks for msg in track if msg.type == 'note_on']
+
+
+class HighRegisterTest(unittest.TestCase):
+    """Notes pushed above MIDI note 127 must not fail the song."""
+
+    def test_instrument_offset_above_range(self):
+        # B8 is MIDI note 119; the Flute pattern adds two octaves to every third note
+        melody = [('B8', 0.5)] * 6
+        notes = _note_ons(create_midi_bytes(melody, ['B Major'], ['Flute'], 100, {'enabled': False}))
+        melody_notes = [note for channel, note in notes]
+        self.assertTrue(all(0 <= note <= 127 for note in melody_notes))
+        # folded back by octaves, so the pitch class is kept
+        self.assertTrue(all(note % 12 == 11 for note in melody_notes[:6]))
+
+    def test_rule_model_flute_high_scale(self):
+        generator = MusicGenerator()
+        for mood in ('Calm', 'Neutral', 'Energetic'):
+            for seed in range(5):
+                with self.subTest(mood=mood, seed=seed):
+                    random.seed(seed)
+                    song = generator._compose({'genre': 'Pop', 'mode': 'rule', 'instruments': ['Flute'],
+                                               'scale': 'B Pentatonic Major', 'mood': mood})
+                    notes = _note_ons(create_midi_bytes(**song))
+                    self.assertTrue(notes)
+                    self.assertTrue(all(0 <= note <= 127 for _, note in notes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const audioPlayer = document.getElementById('audio-player');
     const downloadLink = document.getElementById('download-link');
     const loading = document.getElementById('loading');
+    const [genreEl, scaleEl, moodEl, tempoEl, lengthEl, vocalsTypeEl, complexityEl, modeEl, instrumentsSelect] =
+        ['genre', 'scale', 'mood', 'tempo', 'length', 'vocals-type', 'complexity', 'mode', 'instruments']
+        .map(id => document.getElementById(id));
+    const instrumentOptions = instrumentsSelect.options;
     
     // Ensure loading spinner is hidden on page load
     loading.classList.add('hidden');
@@ -23,73 +27,102 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     // Generate music
+    let controller = null;
+    let jobId = null;
     generateBtn.addEventListener('click', generateMusic);
     regenerateBtn.addEventListener('click', generateMusic);
     
-    function generateMusic() {
+    async function generateMusic() {
+        // Abandon the previous request, if any, and cancel its job
+        controller?.abort();
+        if (jobId !== null) {
+            fetch(`/status/${jobId}`, {method: 'DELETE', keepalive: true});
+            jobId = null;
+        }
+        controller = new AbortController();
+        const signal = controller.signal;
+        
         // Show loading spinner
         loading.classList.remove('hidden');
         loading.style.display = 'flex';
         
         // Get selected instruments
-        const instrumentsSelect = document.getElementById('instruments');
-        const selectedInstruments = Array.from(instrumentsSelect.selectedOptions).map(option => option.value);
+        const selectedInstruments = [];
+        for (let i = 0; i < instrumentOptions.length; i++) {
+            if (instrumentOptions[i].selected) {
+                selectedInstruments.push(instrumentOptions[i].value);
+            }
+        }
         
         // Get vocals parameters
         const vocalsParams = {
             enabled: vocalsEnabled.checked,
-            type: document.getElementById('vocals-type').value
+            type: vocalsTypeEl.value
         };
         
         // Prepare parameters
         const params = {
-            genre: document.getElementById('genre').value,
+            genre: genreEl.value,
             instruments: selectedInstruments.length > 0 ? selectedInstruments : ['Piano'],
-            scale: document.getElementById('scale').value,
-            mood: document.getElementById('mood').value,
-            tempo: document.getElementById('tempo').value,
-            length: document.getElementById('length').value,
+            scale: scaleEl.value,
+            mood: moodEl.value,
+            tempo: tempoEl.value,
+            length: lengthEl.value,
             vocals: vocalsParams,
-            complexity: document.getElementById('complexity').value,
-            mode: document.getElementById('mode').value
+            complexity: complexityEl.value,
+            mode: modeEl.value
         };
         
-        // Send request to server
-        fetch('/generate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(params)
-        })
-        .then(response => response.json())
-        .then(data => {
-            // Hide loading spinner
-            loading.classList.add('hidden');
-            loading.style.display = 'none';
-            
-            if (data.success) {
-                // Show player section
-                playerSection.classList.remove('hidden');
-                
-                // Set audio source
-                const mp3Url = `/output/${data.mp3_path}`;
-                audioPlayer.src = mp3Url;
-                audioPlayer.play();
-                
-                // Set download link
-                downloadLink.href = mp3Url;
-                downloadLink.download = data.mp3_path;
-            } else {
-                alert(`Error: ${data.error}`);
+        try {
+            // Send request to server
+            const response = await fetch('/generate', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(params),
+                signal: signal
+            });
+            let data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error);
             }
-        })
-        .catch(error => {
-            // Hide loading spinner
-            loading.classList.add('hidden');
-            loading.style.display = 'none';
             
+            // Wait for the generation job to finish, checking once a second
+            const currentJobId = jobId = data.job_id;
+            do {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                data = await (await fetch(`/status/${currentJobId}`, {signal: signal})).json();
+                if (!data.success) {
+                    jobId = null;
+                    throw new Error(data.error);
+                }
+            } while (data.state === 'pending');
+            jobId = null;
+            
+            // Show player section
+            playerSection.classList.remove('hidden');
+            
+            // Set audio source
+            const mp3Url = `/output/${data.mp3_path}`;
+            audioPlayer.src = mp3Url;
+            audioPlayer.play();
+            
+            // Set download link
+            downloadLink.href = mp3Url;
+            downloadLink.download = data.mp3_path;
+        } catch (error) {
+            // A newer request replaced this one
+            if (error.name === 'AbortError') {
+                return;
+            }
             alert(`Error: ${error.message}`);
-        });
+        } finally {
+            // Hide loading spinner, unless a newer request is still running
+            if (controller.signal === signal) {
+                loading.classList.add('hidden');
+                loading.style.display = 'none';
+            }
+        }
     }
 });
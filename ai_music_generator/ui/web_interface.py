@@ -3,78 +3,426 @@ Web interface for the AI Music Generator.
 """
 
 import os
+import gzip
+import hashlib
 import json
-from flask import Flask, request, render_template, send_from_directory, jsonify
-from core.music_generator import MusicGenerator
+import logging
+import mimetypes
+import threading
+import time
+import uuid
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, request, render_template, send_file, jsonify, abort
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import safe_join
+from flask.json.provider import DefaultJSONProvider
+from core.music_generator import get_generator
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; without it Flask's standard JSON handling is used
+    orjson = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:
+    # The minifiers are optional; without them the assets are written as is
+    rcssmin = rjsmin = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    # Flask-Compress is optional; without it responses are sent uncompressed
+    Compress = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fastjsonschema
+except ImportError:
+    # fastjsonschema is optional; without it parameters are checked during generation
+    fastjsonschema = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that parses and serializes with orjson."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+logger = logging.getLogger(__name__)
+
+# Built at import, before Gunicorn (with --preload) and the generation pool
+# fork, so that worker processes share the models copy-on-write
+music_generator = get_generator()
+
+# Cache lifetime for generated files in seconds (one year)
+GENERATED_FILE_MAX_AGE = 31536000
+
+# Schema of the /generate request parameters
+_PARAMS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'genre': {'type': 'string', 'minLength': 1},
+        'instruments': {
+            'oneOf': [
+                {'type': 'array', 'items': {'type': 'string'}},
+                {'type': 'string'}
+            ]
+        },
+        'scale': {'type': 'string'},
+        'mood': {'type': 'string'},
+        'tempo': {'type': 'string'},
+        'length': {'type': 'string'},
+        'vocals': {'type': 'object'},
+        'complexity': {'type': 'string'},
+        'mode': {'type': 'string'}
+    },
+    'required': ['genre']
+}
+
+# Parameters passed on to the music generator
+_PARAM_KEYS = tuple(_PARAMS_SCHEMA['properties'])
+
+# Compiled once into a specialized validation function
+_validate_schema = fastjsonschema.compile(_PARAMS_SCHEMA) if fastjsonschema is not None else None
+
+def _validate_params(params):
+    """
+    Validate /generate request parameters and normalize them.
+    
+    Args:
+        params (dict): Parameters from the request body
+        
+    Returns:
+        dict: The known parameters, with instruments as a list
+        
+    Raises:
+        ValueError: If the parameters don't match the schema
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Invalid parameters: expected a JSON object")
+    
+    if _validate_schema is not None:
+        try:
+            params = _validate_schema(params)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"Invalid parameters: {e.message}") from e
+    
+    # Keep only the known parameters, in a fixed order
+    params = {key: params[key] for key in _PARAM_KEYS if key in params}
+    
+    # Ensure instruments is a list
+    instruments = params.get('instruments')
+    if instruments is not None and not isinstance(instruments, list):
+        params['instruments'] = [instruments]
+    return params
+
+# Generation jobs run in worker processes; their futures and the time they
+# were last polled are keyed by job id
+_executor = None
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+# Jobs that nobody polls for this many seconds are cancelled and forgotten
+JOB_TTL = 10 * 60
+
+def _evict_jobs():
+    """Cancel and forget the jobs that haven't been polled within JOB_TTL."""
+    expired = time.monotonic() - JOB_TTL
+    with _jobs_lock:
+        for job_id, (future, last_polled) in list(_jobs.items()):
+            if last_polled < expired:
+                future.cancel()
+                del _jobs[job_id]
+
+def _get_executor():
+    """Get the process pool that runs generation jobs, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+def _run_generation(params):
+    """
+    Generate music in a worker process.
+    
+    Args:
+        params (dict): Dictionary of user parameters
+        
+    Returns:
+        str: Path to the generated MP3 file
+    """
+    return music_generator.generate_music(params, unique=True)
 
 def start_web_server(port=12000):
     """
-    Start the web interface for the AI Music Generator.
+    Start the web interface for the AI Music Generator on the development server.
+    
+    For production, serve the application from wsgi.py with Gunicorn instead.
     
     Args:
         port (int): Port number to run the server on
     """
-    app = Flask(__name__, template_folder='../ui/templates', static_folder='../ui/static')
-    music_generator = MusicGenerator()
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
     
-    # Create templates and static directories if they don't exist
-    os.makedirs('../ui/templates', exist_ok=True)
-    os.makedirs('../ui/static', exist_ok=True)
+    # Start the server, handling each request on its own thread so that
+    # downloads are served while music is being generated
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)
+
+def create_app():
+    """
+    Create the Flask application for the AI Music Generator.
+    
+    Returns:
+        Flask: The configured application
+    """
+    # The page inlines its styles and script, so Flask doesn't serve
+    # ui/static; when the files are needed, Nginx serves them directly
+    app = Flask(__name__, template_folder='../ui/templates', static_folder=None)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    
+    # Templates only change between runs, so outside debugging skip the
+    # reload checks and keep compiled templates on disk across restarts
+    if os.environ.get('FLASK_DEBUG') != '1':
+        app.config['TEMPLATES_AUTO_RELOAD'] = False
+        jinja_cache_dir = os.path.join(os.path.dirname(__file__), '.jinja_cache')
+        _ensure_dir(jinja_cache_dir)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=jinja_cache_dir)
+    
+    # Compress text responses; audio/mpeg isn't in the compressed mimetypes
+    if Compress is not None:
+        app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+        app.config['COMPRESS_MIN_SIZE'] = 256
+        Compress(app)
+    
+    # Behind Nginx, let it send generated files itself (see DOCUMENTATION.md)
+    app.config['USE_XACCEL'] = os.environ.get('USE_XACCEL') == '1'
     
     # Create output directory if it doesn't exist
-    os.makedirs('../output', exist_ok=True)
+    output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output'))
+    _ensure_dir(output_dir)
     
     @app.route('/')
     def index():
         """Render the main page."""
-        return render_template('index.html')
+        encoding = request.accept_encodings.best_match(index_encodings, default='identity')
+        resp = app.response_class(index_bodies[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            resp.headers['Content-Encoding'] = encoding
+        resp.vary.add('Accept-Encoding')
+        resp.set_etag(f"{index_etag}-{encoding}")
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 300
+        return resp.make_conditional(request)
     
     @app.route('/generate', methods=['POST'])
     def generate():
-        """Generate music based on user parameters."""
+        """Start generating music based on user parameters."""
         try:
             # Get parameters from request
-            params = request.json
+            # A missing or malformed body reads as None and fails validation
+            params = _validate_params(request.get_json(silent=True))
             
             # Log the parameters for debugging
-            print(f"Generating music with parameters: {params}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Generating music with parameters: %s", params)
             
-            # Ensure instruments is a list
-            if 'instruments' in params and not isinstance(params['instruments'], list):
-                params['instruments'] = [params['instruments']]
+            # Queue the generation and let the client poll /status for it
+            _evict_jobs()
+            job_id = uuid.uuid4().hex
+            future = _get_executor().submit(_run_generation, params)
+            with _jobs_lock:
+                _jobs[job_id] = (future, time.monotonic())
             
-            # Generate music
-            mp3_path = music_generator.generate_music(params)
+            return jsonify({
+                'success': True,
+                'job_id': job_id
+            }), 202
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            logger.exception("Failed to start music generation")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/status/<job_id>')
+    def status(job_id):
+        """Report the state of a generation job."""
+        _evict_jobs()
+        with _jobs_lock:
+            job = _jobs.get(job_id)
+            if job is not None:
+                future = job[0]
+                if future.done():
+                    del _jobs[job_id]
+                else:
+                    _jobs[job_id] = (future, time.monotonic())
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Unknown job'
+            }), 404
+        
+        if not future.done():
+            return jsonify({
+                'success': True,
+                'state': 'pending'
+            })
+        
+        try:
+            mp3_path = future.result()
             
             # Return the path to the generated MP3 file
             return jsonify({
                 'success': True,
+                'state': 'done',
                 'mp3_path': os.path.basename(mp3_path)
             })
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Music generation failed")
             return jsonify({
                 'success': False,
                 'error': str(e)
             })
     
+    @app.route('/status/<job_id>', methods=['DELETE'])
+    def cancel(job_id):
+        """Cancel a generation job the client no longer waits for."""
+        with _jobs_lock:
+            job = _jobs.pop(job_id, None)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Unknown job'
+            }), 404
+        
+        # A job that is already running can't be stopped; its files are
+        # pruned with the other old output
+        job[0].cancel()
+        return jsonify({
+            'success': True
+        })
+    
     @app.route('/output/<path:filename>')
     def download_file(filename):
         """Serve generated music files."""
-        return send_from_directory('../output', filename)
+        if app.config.get('USE_XACCEL'):
+            internal_path = safe_join('/_protected_output', filename)
+            if internal_path is None:
+                abort(404)
+            resp = app.response_class('')
+            resp.headers['X-Accel-Redirect'] = internal_path
+            # Conversion falls back to WAV when ffmpeg is missing
+            resp.headers['Content-Type'] = mimetypes.guess_type(filename)[0] or 'audio/mpeg'
+            return resp
+        
+        # safe_join rejects paths that would escape the output directory
+        path = safe_join(output_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        
+        # Conditional responses answer revalidations with 304, and the file
+        # wrapper lets the server use sendfile() for the body
+        return send_file(
+            path,
+            mimetype=mimetypes.guess_type(filename)[0] or 'audio/mpeg',
+            conditional=True,
+            etag=True,
+            last_modified=os.path.getmtime(path),
+            max_age=GENERATED_FILE_MAX_AGE
+        )
+    
+    @app.after_request
+    def cache_generated_files(resp):
+        """Let clients cache generated files, whose names are never reused."""
+        if request.path.startswith('/output/') and resp.status_code in (200, 304):
+            resp.cache_control.no_cache = None
+            resp.cache_control.public = True
+            resp.cache_control.max_age = GENERATED_FILE_MAX_AGE
+            resp.cache_control.immutable = True
+        return resp
+    
+    # The page doesn't change between requests, so render it once with the
+    # styles and script inlined to save the browser two extra requests
+    with app.app_context():
+        index_html = render_template('index.html', inline_css=_assets['css'], inline_js=_assets['js']).encode('utf-8')
+    index_etag = hashlib.sha1(index_html).hexdigest()
+    
+    # Compress the page once here rather than on every request
+    index_bodies = {'gzip': gzip.compress(index_html, compresslevel=9), 'identity': index_html}
+    if brotli is not None:
+        index_bodies['br'] = brotli.compress(index_html, quality=11)
+    index_encodings = [e for e in ('br', 'gzip', 'identity') if e in index_bodies]
+    
+    return app
+
+# Directories already created by this process
+_created_dirs = set()
+
+def _ensure_dir(path):
+    """
+    Create a directory (and its parents) unless this process already did.
     
-    # Create HTML template
-    create_html_template()
+    Args:
+        path (str): Directory to create
+    """
+    if path not in _created_dirs:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
+def _write_if_changed(path, text):
+    """
+    Write a text file unless it already has the given contents.
     
-    # Create CSS file
-    create_css_file()
+    Args:
+        path (str): Path of the file
+        text (str): Contents to write
+        
+    Returns:
+        bool: True if the file was written
+    """
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+def _write_precompressed(path, text):
+    """
+    Write compressed copies of a static asset next to it.
     
-    # Create JavaScript file
-    create_js_file()
+    Nginx can then serve them directly with gzip_static/brotli_static.
     
-    # Start the server
-    app.run(host='0.0.0.0', port=port, debug=True)
+    Args:
+        path (str): Path of the asset
+        text (str): Contents of the asset
+    """
+    data = text.encode('utf-8')
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data))
 
 def create_html_template():
     """Create the HTML template for the web interface."""
@@ -84,7 +432,7 @@ def create_html_template():
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>AI Music Generator</title>
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
+    <style>{{ inline_css|safe }}</style>
 </head>
 <body>
     <div class="container">
@@ -224,20 +572,24 @@ def create_html_template():
         </footer>
     </div>
     
-    <script src="{{ url_for('static', filename='script.js') }}"></script>
+    <script>{{ inline_js|safe }}</script>
 </body>
 </html>
 """
     
     # Create templates directory if it doesn't exist
-    os.makedirs(os.path.join(os.path.dirname(__file__), 'templates'), exist_ok=True)
+    _ensure_dir(os.path.join(os.path.dirname(__file__), 'templates'))
     
     # Write the HTML template
-    with open(os.path.join(os.path.dirname(__file__), 'templates', 'index.html'), 'w') as f:
-        f.write(html)
+    _write_if_changed(os.path.join(os.path.dirname(__file__), 'templates', 'index.html'), html)
 
 def create_css_file():
-    """Create the CSS file for the web interface."""
+    """
+    Create the CSS file for the web interface.
+    
+    Returns:
+        str: The CSS written, minified if rcssmin is installed
+    """
     css = """/* Reset and base styles */
 * {
     margin: 0;
@@ -433,14 +785,28 @@ footer {
 """
     
     # Create static directory if it doesn't exist
-    os.makedirs(os.path.join(os.path.dirname(__file__), 'static'), exist_ok=True)
+    _ensure_dir(os.path.join(os.path.dirname(__file__), 'static'))
     
     # Write the CSS file
-    with open(os.path.join(os.path.dirname(__file__), 'static', 'style.css'), 'w') as f:
-        f.write(css)
+    static_dir = os.path.join(os.path.dirname(__file__), 'static')
+    _write_if_changed(os.path.join(static_dir, 'style.css'), css)
+    
+    # The minified copy is a build artifact, so the tracked source stays readable
+    if rcssmin is not None:
+        css = rcssmin.cssmin(css)
+    min_path = os.path.join(static_dir, 'style.min.css')
+    if _write_if_changed(min_path, css) or not os.path.exists(min_path + '.gz'):
+        _write_precompressed(min_path, css)
+    
+    return css
 
 def create_js_file():
-    """Create the JavaScript file for the web interface."""
+    """
+    Create the JavaScript file for the web interface.
+    
+    Returns:
+        str: The JavaScript written, minified if rjsmin is installed
+    """
     js = """document.addEventListener('DOMContentLoaded', function() {
     // Elements
     const generateBtn = document.getElementById('generate-btn');
@@ -451,6 +817,10 @@ def create_js_file():
     const audioPlayer = document.getElementById('audio-player');
     const downloadLink = document.getElementById('download-link');
     const loading = document.getElementById('loading');
+    const [genreEl, scaleEl, moodEl, tempoEl, lengthEl, vocalsTypeEl, complexityEl, modeEl, instrumentsSelect] =
+        ['genre', 'scale', 'mood', 'tempo', 'length', 'vocals-type', 'complexity', 'mode', 'instruments']
+        .map(id => document.getElementById(id));
+    const instrumentOptions = instrumentsSelect.options;
     
     // Ensure loading spinner is hidden on page load
     loading.classList.add('hidden');
@@ -466,81 +836,140 @@ def create_js_file():
     });
     
     // Generate music
+    let controller = null;
+    let jobId = null;
     generateBtn.addEventListener('click', generateMusic);
     regenerateBtn.addEventListener('click', generateMusic);
     
-    function generateMusic() {
+    async function generateMusic() {
+        // Abandon the previous request, if any, and cancel its job
+        controller?.abort();
+        if (jobId !== null) {
+            fetch(`/status/${jobId}`, {method: 'DELETE', keepalive: true});
+            jobId = null;
+        }
+        controller = new AbortController();
+        const signal = controller.signal;
+        
         // Show loading spinner
         loading.classList.remove('hidden');
         loading.style.display = 'flex';
         
         // Get selected instruments
-        const instrumentsSelect = document.getElementById('instruments');
-        const selectedInstruments = Array.from(instrumentsSelect.selectedOptions).map(option => option.value);
+        const selectedInstruments = [];
+        for (let i = 0; i < instrumentOptions.length; i++) {
+            if (instrumentOptions[i].selected) {
+                selectedInstruments.push(instrumentOptions[i].value);
+            }
+        }
         
         // Get vocals parameters
         const vocalsParams = {
             enabled: vocalsEnabled.checked,
-            type: document.getElementById('vocals-type').value
+            type: vocalsTypeEl.value
         };
         
         // Prepare parameters
         const params = {
-            genre: document.getElementById('genre').value,
+            genre: genreEl.value,
             instruments: selectedInstruments.length > 0 ? selectedInstruments : ['Piano'],
-            scale: document.getElementById('scale').value,
-            mood: document.getElementById('mood').value,
-            tempo: document.getElementById('tempo').value,
-            length: document.getElementById('length').value,
+            scale: scaleEl.value,
+            mood: moodEl.value,
+            tempo: tempoEl.value,
+            length: lengthEl.value,
             vocals: vocalsParams,
-            complexity: document.getElementById('complexity').value,
-            mode: document.getElementById('mode').value
+            complexity: complexityEl.value,
+            mode: modeEl.value
         };
         
-        // Send request to server
-        fetch('/generate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(params)
-        })
-        .then(response => response.json())
-        .then(data => {
-            // Hide loading spinner
-            loading.classList.add('hidden');
-            loading.style.display = 'none';
-            
-            if (data.success) {
-                // Show player section
-                playerSection.classList.remove('hidden');
-                
-                // Set audio source
-                const mp3Url = `/output/${data.mp3_path}`;
-                audioPlayer.src = mp3Url;
-                audioPlayer.play();
-                
-                // Set download link
-                downloadLink.href = mp3Url;
-                downloadLink.download = data.mp3_path;
-            } else {
-                alert(`Error: ${data.error}`);
+        try {
+            // Send request to server
+            const response = await fetch('/generate', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(params),
+                signal: signal
+            });
+            let data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error);
             }
-        })
-        .catch(error => {
-            // Hide loading spinner
-            loading.classList.add('hidden');
-            loading.style.display = 'none';
             
+            // Wait for the generation job to finish, checking once a second
+            const currentJobId = jobId = data.job_id;
+            do {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                data = await (await fetch(`/status/${currentJobId}`, {signal: signal})).json();
+                if (!data.success) {
+                    jobId = null;
+                    throw new Error(data.error);
+                }
+            } while (data.state === 'pending');
+            jobId = null;
+            
+            // Show player section
+            playerSection.classList.remove('hidden');
+            
+            // Set audio source
+            const mp3Url = `/output/${data.mp3_path}`;
+            audioPlayer.src = mp3Url;
+            audioPlayer.play();
+            
+            // Set download link
+            downloadLink.href = mp3Url;
+            downloadLink.download = data.mp3_path;
+        } catch (error) {
+            // A newer request replaced this one
+            if (error.name === 'AbortError') {
+                return;
+            }
             alert(`Error: ${error.message}`);
-        });
+        } finally {
+            // Hide loading spinner, unless a newer request is still running
+            if (controller.signal === signal) {
+                loading.classList.add('hidden');
+                loading.style.display = 'none';
+            }
+        }
     }
 });
 """
     
     # Create static directory if it doesn't exist
-    os.makedirs(os.path.join(os.path.dirname(__file__), 'static'), exist_ok=True)
+    _ensure_dir(os.path.join(os.path.dirname(__file__), 'static'))
     
     # Write the JavaScript file
-    with open(os.path.join(os.path.dirname(__file__), 'static', 'script.js'), 'w') as f:
-        f.write(js)
+    static_dir = os.path.join(os.path.dirname(__file__), 'static')
+    _write_if_changed(os.path.join(static_dir, 'script.js'), js)
+    
+    # The minified copy is a build artifact, so the tracked source stays readable
+    if rjsmin is not None:
+        js = rjsmin.jsmin(js)
+    min_path = os.path.join(static_dir, 'script.min.js')
+    if _write_if_changed(min_path, js) or not os.path.exists(min_path + '.gz'):
+        _write_precompressed(min_path, js)
+    
+    return js
+
+# Assets written by this process, see _ensure_assets()
+_assets = None
+
+def _ensure_assets():
+    """
+    Write the HTML template and static files once per process.
+    
+    Files that are already up to date on disk are left alone, so worker
+    processes forked after import don't rewrite them.
+    
+    Returns:
+        dict: The CSS and JavaScript written, keyed by 'css' and 'js'
+    """
+    global _assets
+    if _assets is None:
+        create_html_template()
+        _assets = {'css': create_css_file(), 'js': create_js_file()}
+    return _assets
+
+_ensure_assets()
@@ -2,14 +2,34 @@
 MIDI utilities for the AI Music Generator.
 """
 
+import hashlib
+import io
+import json
 import os
+import re
+import shutil
+import struct
 import subprocess
+import sys
 import tempfile
-from midiutil import MIDIFile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from types import MappingProxyType
+import numpy as np
 from utils.music_theory import note_to_midi, get_chord_notes
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
 # Define instrument mapping (General MIDI program numbers)
-INSTRUMENT_MAP = {
+_INSTRUMENT_PROGRAMS = {
     'Piano': 0,
     'Acoustic Grand Piano': 0,
     'Bright Acoustic Piano': 1,
@@ -148,23 +168,271 @@ INSTRUMENT_MAP = {
     'Strings': 48,
 }
 
+# Read-only view of the mapping, with interned names for fast lookups
+INSTRUMENT_MAP = MappingProxyType({sys.intern(name): program for name, program in _INSTRUMENT_PROGRAMS.items()})
+
+# Small integer code per instrument name, indexing into PROGRAMS
+INSTRUMENT_CODE = MappingProxyType({name: code for code, name in enumerate(INSTRUMENT_MAP)})
+PROGRAMS = np.fromiter(INSTRUMENT_MAP.values(), dtype=np.int8, count=len(INSTRUMENT_MAP))
+
+# Melody pattern per instrument: (pitch offset, velocity, modulo, remainder).
+# The instrument plays the note shifted by the offset at the given velocity
+# on notes whose index % modulo == remainder, and the plain note at velocity
+# 90 otherwise. Drums are handled separately.
+MELODY_PATTERNS = {
+    'Piano': (0, 100, 1, 0),
+    'Guitar': (12, 90, 3, 0),
+    'Bass': (-12, 95, 4, 0),
+    'Violin': (12, 85, 2, 1),
+    'Synth': (7, 80, 3, 1),
+    'Flute': (24, 75, 3, 2),
+    'Trumpet': (12, 90, 4, 2),
+}
+DEFAULT_MELODY_PATTERN = (0, 90, 1, 0)
+
+# Every pattern repeats after PATTERN_PERIOD notes (the LCM of the moduli),
+# so whether an instrument plays its pattern note is a lookup in its row of
+# hits at index % PATTERN_PERIOD
+PATTERN_PERIOD = 12
+
+
+def _pattern_hits(pattern):
+    """
+    Get the notes, within one pattern period, on which a melody pattern plays.
+
+    Args:
+        pattern (tuple): (offset, velocity, modulo, remainder)
+
+    Returns:
+        numpy.ndarray: PATTERN_PERIOD booleans
+    """
+    _, _, modulo, remainder = pattern
+    hits = np.arange(PATTERN_PERIOD) % modulo == remainder
+    hits.setflags(write=False)
+    return hits
+
+
+MELODY_PATTERN_HITS = MappingProxyType({name: _pattern_hits(pattern) for name, pattern in MELODY_PATTERNS.items()})
+DEFAULT_MELODY_PATTERN_HITS = _pattern_hits(DEFAULT_MELODY_PATTERN)
+
+# MIDI time resolution used for note events; melody durations and chords
+# are measured in 4-beat bars
+TICKS_PER_BEAT = 960
+TICKS_PER_BAR = 4 * TICKS_PER_BEAT
+
+
+@njit(nogil=True, cache=True)
+def _melody_events(indices, pitches, times, durations, patterns, hits, is_drums, first_track=0):
+    """
+    Compute the melody note events of consecutive instrument tracks.
+
+    Args:
+        indices (numpy.ndarray): Melody index of each playable note
+        pitches (numpy.ndarray): MIDI note number of each playable note
+        times (numpy.ndarray): Start time of each playable note in ticks
+        durations (numpy.ndarray): Duration of each playable note in ticks
+        patterns (numpy.ndarray): (offset, velocity, modulo, remainder) per instrument
+        hits (numpy.ndarray): Pattern hits of each instrument over PATTERN_PERIOD notes
+        is_drums (numpy.ndarray): Whether each instrument is the drum kit
+        first_track (int): Track (and channel) of the first instrument
+
+    Returns:
+        tuple: (events, count) where the first count rows of events are
+               (track, channel, pitch, time, duration, velocity)
+    """
+    n_instruments = patterns.shape[0]
+    n_notes = indices.shape[0]
+    # at most two events (drum hit and accent) per note and instrument
+    events = np.empty((n_instruments * n_notes * 2, 6), dtype=np.int32)
+    count = 0
+    for t in range(n_instruments):
+        track = first_track + t
+        channel = 9 if is_drums[t] else track
+        offset = patterns[t, 0]
+        velocity = patterns[t, 1]
+        track_hits = hits[t]
+        for k in range(n_notes):
+            idx = indices[k]
+            events[count, 0] = track
+            events[count, 1] = channel
+            events[count, 3] = times[k]
+            events[count, 4] = durations[k]
+            if is_drums[t] and idx % 2 == 0:
+                events[count, 2] = 38
+                events[count, 5] = 100
+                if idx % 4 == 0:
+                    count += 1
+                    events[count, 0] = track
+                    events[count, 1] = channel
+                    events[count, 2] = 36
+                    events[count, 3] = times[k]
+                    events[count, 4] = durations[k]
+                    events[count, 5] = 110
+            elif track_hits[idx % PATTERN_PERIOD]:
+                events[count, 2] = pitches[k] + offset
+                events[count, 5] = velocity
+            else:
+                events[count, 2] = pitches[k]
+                events[count, 5] = 90
+            count += 1
+    return events, count
+
+
+# Note name followed by an optional single-digit octave
+_NOTE_RE = re.compile(r'(.*?)([0-9])?', re.DOTALL)
+
 
 def parse_note(note_str):
     """
     Parse a note string into note name and octave.
     """
-    if note_str[-1].isdigit():
-        octave = int(note_str[-1])
-        note_name = note_str[:-1]
-    else:
-        octave = 4
-        note_name = note_str
-    return note_name, octave
+    note_name, octave = _NOTE_RE.fullmatch(note_str).groups()
+    return note_name, int(octave) if octave else 4
 
 
-def create_midi_file(melody, harmony, instruments=['Piano'], bpm=100, vocals=None):
+@lru_cache(maxsize=256)
+def _safe_parse(note_str):
     """
-    Create a MIDI file from melody and harmony.
+    Convert a note string to a MIDI note number.
+
+    Args:
+        note_str (str): Note with optional octave (e.g., 'C#4')
+
+    Returns:
+        int: MIDI note number, or None if the note is invalid
+    """
+    try:
+        return note_to_midi(*parse_note(note_str))
+    except ValueError:
+        return None
+
+
+# Meta event closing every track
+_END_OF_TRACK = b'\x00\xff\x2f\x00'
+
+
+def _encode_track(channel, program, ticks, durations, pitches, velocities):
+    """
+    Encode the notes of one instrument track as a Standard MIDI File track chunk.
+
+    Notes are serialized in start order; at equal ticks note-offs come
+    before note-ons and otherwise the order of the given notes is kept.
+
+    Args:
+        channel (int): MIDI channel of the track
+        program (int): General MIDI program selected at the start of the track
+        ticks (numpy.ndarray): Start tick of each note
+        durations (numpy.ndarray): Duration of each note in ticks
+        pitches (numpy.ndarray): MIDI note number of each note
+        velocities (numpy.ndarray): Velocity of each note
+
+    Returns:
+        bytes: The MTrk chunk
+    """
+    # notes without a duration would be switched off before they start
+    sounding = durations > 0
+    n = int(np.count_nonzero(sounding))
+    ticks = ticks[sounding].astype(np.int64)
+    pitches = pitches[sounding]
+    velocities = velocities[sounding]
+    # fold notes outside the MIDI range back into it by whole octaves, and
+    # clamp velocities, rather than failing the whole song
+    pitches = np.where(pitches > 127, pitches - 12 * ((pitches - 116) // 12), pitches)
+    pitches = np.where(pitches < 0, pitches + 12 * ((11 - pitches) // 12), pitches)
+    velocities = np.clip(velocities, 0, 127)
+
+    # every note becomes a note-on and a note-off event
+    event_ticks = np.concatenate((ticks, ticks + durations[sounding]))
+    is_off = np.repeat(np.array([False, True]), n)
+    order = np.lexsort((np.tile(np.arange(n), 2), ~is_off, event_ticks))
+    event_ticks = event_ticks[order]
+    is_off = is_off[order]
+
+    # delta times as variable-length quantities of 1-4 bytes, most
+    # significant 7 bits first, followed by the 3 bytes of the event
+    deltas = np.diff(event_ticks, prepend=0)
+    vlq_len = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    ends = np.cumsum(vlq_len + 3)
+    starts = ends - vlq_len - 3
+    data = np.empty(ends[-1] if len(ends) else 0, dtype=np.uint8)
+    for k in range(4):
+        has_byte = vlq_len > k
+        remaining = vlq_len[has_byte] - 1 - k
+        data[starts[has_byte] + k] = ((deltas[has_byte] >> (7 * remaining)) & 0x7f) | np.where(remaining > 0, 0x80, 0)
+    status_at = starts + vlq_len
+    data[status_at] = np.where(is_off, 0x80 | channel, 0x90 | channel)
+    data[status_at + 1] = np.tile(pitches, 2)[order]
+    data[status_at + 2] = np.tile(velocities, 2)[order]
+
+    body = bytes((0x00, 0xC0 | channel, program)) + data.tobytes() + _END_OF_TRACK
+    return b'MTrk' + struct.pack('>L', len(body)) + body
+
+
+# Workers building the tracks of the different instruments, created on first use
+_track_pool = None
+
+def _get_track_pool():
+    """
+    Get the thread pool used to build instrument tracks in parallel.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared pool
+    """
+    global _track_pool
+    if _track_pool is None:
+        _track_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+    return _track_pool
+
+
+def _reset_track_pool():
+    """Forget the track pool in a forked child, whose copy has no threads."""
+    global _track_pool
+    _track_pool = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_track_pool)
+
+
+def _build_tracks(i, instrument, program, harmony_notes, melody):
+    """
+    Build the melody and harmony tracks of one instrument.
+
+    Args:
+        i (int): Index of the instrument
+        instrument (str): Instrument name
+        program (int): General MIDI program of the instrument
+        harmony_notes (list): (start tick, MIDI note) of the instrument's chord notes
+        melody (tuple): (indices, pitches, times, durations) arrays of the playable melody notes
+
+    Returns:
+        tuple: (melody_track, harmony_track) MTrk chunks
+    """
+    # assign percussion to channel 9, others to unique channels
+    channel = 9 if instrument == 'Drums' else i
+
+    # instrument-specific pattern for the melody track
+    pattern = np.array([MELODY_PATTERNS.get(instrument, DEFAULT_MELODY_PATTERN)], dtype=np.int32)
+    hits = np.array([MELODY_PATTERN_HITS.get(instrument, DEFAULT_MELODY_PATTERN_HITS)], dtype=np.bool_)
+    is_drums = np.array([instrument == 'Drums'], dtype=np.bool_)
+    events, count = _melody_events(*melody, pattern, hits, is_drums, i)
+    events = events[:count]
+    melody_track = _encode_track(channel, program, events[:, 3], events[:, 4], events[:, 2], events[:, 5])
+
+    # chord notes last the whole bar
+    harmony = np.array(harmony_notes, dtype=np.int32).reshape(-1, 2)
+    n = len(harmony)
+    harmony_track = _encode_track(channel, program, harmony[:, 0], np.full(n, TICKS_PER_BAR, dtype=np.int32),
+                                  harmony[:, 1], np.full(n, 80, dtype=np.int32))
+    return melody_track, harmony_track
+
+
+def _build_midi(melody, harmony, instruments, bpm, vocals):
+    """
+    Build Standard MIDI File data from melody and harmony.
+
+    The file is a format 1 file with a tempo track followed by the melody
+    tracks and then the harmony tracks of all instruments.
 
     Args:
         melody (list): List of (note, duration) tuples
@@ -174,151 +442,278 @@ def create_midi_file(melody, harmony, instruments=['Piano'], bpm=100, vocals=Non
         vocals (dict, optional): Vocals parameters
 
     Returns:
-        str: Path to the created MIDI file
-    """
-    # Total tracks = melody + harmony for each instrument
-    num_tracks = len(instruments) * 2
-    midi = MIDIFile(num_tracks)
-    midi.addTempo(0, 0, bpm)
-
-    # --- Melody Tracks ---
-    for i, instrument in enumerate(instruments):
-        track = i
-        # assign percussion to channel 9, others to unique channels
-        channel = 9 if instrument == 'Drums' else i
-        program = INSTRUMENT_MAP.get(instrument, 0)
-        midi.addProgramChange(track, channel, 0, program)
-
-        time = 0
-        for idx, (note_str, duration) in enumerate(melody):
-            note_name, octave = parse_note(note_str)
-            try:
-                midi_note = note_to_midi(note_name, octave)
-                # instrument-specific patterns
-                if instrument == 'Piano':
-                    midi.addNote(track, channel, midi_note, time, duration*4, 100)
-                elif instrument == 'Guitar' and idx % 3 == 0:
-                    midi.addNote(track, channel, midi_note+12, time, duration*4, 90)
-                elif instrument == 'Bass' and idx % 4 == 0:
-                    midi.addNote(track, channel, midi_note-12, time, duration*4, 95)
-                elif instrument == 'Drums' and idx % 2 == 0:
-                    midi.addNote(track, channel, 38, time, duration*4, 100)
-                    if idx % 4 == 0:
-                        midi.addNote(track, channel, 36, time, duration*4, 110)
-                elif instrument == 'Violin' and idx % 2 == 1:
-                    midi.addNote(track, channel, midi_note+12, time, duration*4, 85)
-                elif instrument == 'Synth' and idx % 3 == 1:
-                    midi.addNote(track, channel, midi_note+7, time, duration*4, 80)
-                elif instrument == 'Flute' and idx % 3 == 2:
-                    midi.addNote(track, channel, midi_note+24, time, duration*4, 75)
-                elif instrument == 'Trumpet' and idx % 4 == 2:
-                    midi.addNote(track, channel, midi_note+12, time, duration*4, 90)
-                else:
-                    midi.addNote(track, channel, midi_note, time, duration*4, 90)
-            except ValueError:
-                pass
-            time += duration*4
-
-    # --- Harmony Tracks ---
-    for i, instrument in enumerate(instruments):
-        harmony_track = len(instruments) + i
-        channel = 9 if instrument == 'Drums' else i
-        program = INSTRUMENT_MAP.get(instrument, 0)
-        midi.addProgramChange(harmony_track, channel, 0, program)
-
-        time = 0
-        for chord_name in harmony:
-            try:
-                chord_notes = get_chord_notes(chord_name)
-                # distribute chord notes per instrument
-                for note_idx, note_str in enumerate(chord_notes):
-                    # each instrument plays its slice
-                    if note_idx % len(instruments) == i:
-                        note_name, octave = parse_note(note_str)
-                        try:
-                            midi_note = note_to_midi(note_name, octave)
-                            midi.addNote(harmony_track, channel, midi_note, time, 4, 80)
-                        except ValueError:
-                            pass
-            except ValueError:
-                pass
-            time += 4
+        bytes: Standard MIDI file contents
+    """
+    # Total tracks = tempo track + melody + harmony for each instrument
+    num_instruments = len(instruments)
+    header = b'MThd' + struct.pack('>LHHH', 6, 1, 1 + num_instruments * 2, TICKS_PER_BEAT)
+    tempo = struct.pack('>L', int(60000000 / bpm))[1:]
+    tempo_body = b'\x00\xff\x51\x03' + tempo + _END_OF_TRACK
+    tempo_track = b'MTrk' + struct.pack('>L', len(tempo_body)) + tempo_body
+
+    # Parse the melody and harmony once, for all instruments (-1 / None mark
+    # notes that can't be converted to MIDI)
+    melody_notes = (_safe_parse(note_str) for note_str, _ in melody)
+    pitches = np.fromiter((-1 if n is None else n for n in melody_notes), dtype=np.int64, count=len(melody))
+    durations = np.rint(np.fromiter((duration for _, duration in melody), dtype=np.float64, count=len(melody))
+                        * TICKS_PER_BAR).astype(np.int32)
+    times = np.concatenate((np.zeros(1, dtype=np.int32), np.cumsum(durations, dtype=np.int32)[:-1]))
+    # indices of the notes that can be played
+    playable = np.flatnonzero(pitches >= 0).astype(np.int32)
+
+    # progressions repeat, so resolve each distinct chord only once
+    parsed_chords = {}
+    for chord_name in set(harmony):
+        try:
+            parsed_chords[chord_name] = [_safe_parse(note_str) for note_str in get_chord_notes(chord_name)]
+        except ValueError:
+            parsed_chords[chord_name] = []
+
+    # General MIDI program of each instrument (unknown ones use the piano)
+    codes = [INSTRUMENT_CODE.get(instrument) for instrument in instruments]
+    programs = [0 if code is None else int(PROGRAMS[code]) for code in codes]
+
+    # distribute chord notes per instrument: each instrument plays every
+    # len(instruments)-th note of each bar's chord
+    harmony_notes = [[] for _ in instruments]
+    for bar, chord_name in enumerate(harmony if instruments else ()):
+        bar_start = bar * TICKS_PER_BAR
+        for note_idx, midi_note in enumerate(parsed_chords[chord_name]):
+            if midi_note is not None:
+                harmony_notes[note_idx % num_instruments].append((bar_start, midi_note))
+
+    # each instrument's tracks are independent, so build them in parallel
+    # (the melody kernel runs without the GIL) and collect them in order
+    build = partial(_build_tracks,
+                    melody=(playable, pitches[playable].astype(np.int32), times[playable], durations[playable]))
+    if num_instruments > 1:
+        tracks = list(_get_track_pool().map(build, range(num_instruments), instruments, programs, harmony_notes))
+    else:
+        tracks = list(map(build, range(num_instruments), instruments, programs, harmony_notes))
 
     # Vocals (placeholder)
     if vocals and vocals.get('enabled', False):
         pass
 
+    return b''.join([header, tempo_track]
+                    + [melody_track for melody_track, _ in tracks]
+                    + [harmony_track for _, harmony_track in tracks])
+
+
+# Whether the output directory has been created by this process
+_output_dir_ready = False
+
+
+def create_midi_file(melody, harmony, instruments=['Piano'], bpm=100, vocals=None, filename='generated_music.mid',
+                     return_bytes=False):
+    """
+    Create a MIDI file from melody and harmony.
+
+    Args:
+        melody (list): List of (note, duration) tuples
+        harmony (list): List of chord names
+        instruments (list): List of instrument names
+        bpm (int): Tempo in beats per minute
+        vocals (dict, optional): Vocals parameters
+        filename (str): Name of the MIDI file in the output directory
+        return_bytes (bool): Return the MIDI data instead of writing the file
+
+    Returns:
+        str: Path to the created MIDI file, or bytes of MIDI data if
+             return_bytes is set
+    """
+    global _output_dir_ready
+    midi_data = _build_midi(melody, harmony, instruments, bpm, vocals)
+    if return_bytes:
+        return midi_data
+
     # Write out
-    os.makedirs('output', exist_ok=True)
-    midi_path = os.path.join('output', 'generated_music.mid')
+    if not _output_dir_ready:
+        os.makedirs('output', exist_ok=True)
+        _output_dir_ready = True
+    midi_path = os.path.join('output', filename)
     with open(midi_path, 'wb') as f:
-        midi.writeFile(f)
+        f.write(midi_data)
     return midi_path
 
-def midi_to_mp3(midi_path):
+
+def create_midi_bytes(melody, harmony, instruments=['Piano'], bpm=100, vocals=None):
     """
-    Convert a MIDI file to MP3 using FluidSynth and ffmpeg.
+    Create MIDI data from melody and harmony without touching the filesystem.
+
+    Args:
+        melody (list): List of (note, duration) tuples
+        harmony (list): List of chord names
+        instruments (list): List of instrument names
+        bpm (int): Tempo in beats per minute
+        vocals (dict, optional): Vocals parameters
+
+    Returns:
+        bytes: Standard MIDI file contents
+    """
+    return create_midi_file(melody, harmony, instruments, bpm, vocals, return_bytes=True)
+
+# Directory holding downloaded SoundFonts and bundled binaries
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# Places other than the default location where a SoundFont may be installed
+if sys.platform == 'win32':
+    SOUNDFONT_ALT_PATHS = {
+        'Windows': (
+            os.path.join(os.environ.get('ProgramFiles', 'C:\\Program Files'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2'),
+            os.path.join(os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2'),
+            os.path.join(os.path.expanduser('~'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2')
+        )
+    }
+else:
+    SOUNDFONT_ALT_PATHS = {
+        'Linux': (
+            '/usr/share/sounds/sf2/default.sf2',
+            '/usr/share/soundfonts/FluidR3_GM.sf2',
+            '/usr/share/soundfonts/default.sf2'
+        ),
+        'Darwin': (  # macOS
+            '/usr/local/share/fluidsynth/soundfonts/FluidR3_GM.sf2',
+            '/usr/local/share/soundfonts/FluidR3_GM.sf2'
+        )
+    }
+
+# Common FluidSynth installation paths on Windows
+if sys.platform == 'win32':
+    WINDOWS_FLUIDSYNTH_PATHS = (
+        # Prioritize the specific path mentioned by the user
+        'C:\\Program Files\\FluidSynth\\bin\\fluidsynth.exe',
+        # User directory installation (from local installer)
+        os.path.join(os.path.expanduser('~'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
+        # Other common paths as fallbacks
+        os.path.join(os.environ.get('ProgramFiles', 'C:\\Program Files'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
+        os.path.join(os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
+        os.path.join('C:\\tools', 'fluidsynth', 'bin', 'fluidsynth.exe'),
+        os.path.join(os.path.dirname(DATA_DIR), 'bin', 'fluidsynth.exe')
+    )
+else:
+    WINDOWS_FLUIDSYNTH_PATHS = ()
+
+def find_soundfont(system):
+    """
+    Find a SoundFont file, installing or downloading one if necessary.
     
     Args:
-        midi_path (str): Path to the MIDI file
+        system (str): Operating system name as returned by platform.system()
         
     Returns:
-        str: Path to the created MP3 file
+        str: Path to the SoundFont file, or None if none could be found
     """
-    import platform
-    
-    # Detect operating system
-    system = platform.system()
-    
     # Create data directory for soundfonts if it doesn't exist
-    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
-    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(DATA_DIR, exist_ok=True)
     
     # Default soundfont path based on OS
     if system == 'Windows':
-        soundfont_path = os.path.join(data_dir, 'FluidR3_GM.sf2')
+        soundfont_path = os.path.join(DATA_DIR, 'FluidR3_GM.sf2')
     else:  # Linux, macOS
         soundfont_path = '/usr/share/sounds/sf2/FluidR3_GM.sf2'
     
-    # Check if FluidSynth is installed
-    fluidsynth_installed = False
-    fluidsynth_binary_path = None
+    # Check if SoundFont is available
+    soundfont_found = False
+    
+    # First check the specified path
+    if os.path.exists(soundfont_path) and os.path.getsize(soundfont_path) > 0:
+        print(f"SoundFont found at {soundfont_path}")
+        soundfont_found = True
+    else:
+        print(f"SoundFont not found at {soundfont_path}")
+        
+        # Check alternative locations based on OS
+        alternative_paths = SOUNDFONT_ALT_PATHS.get(system, ())
+        
+        # Check all alternative paths
+        for path in alternative_paths:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                print(f"SoundFont found at alternative location: {path}")
+                soundfont_path = path
+                soundfont_found = True
+                break
+        
+        # If still not found, try to install or download
+        if not soundfont_found:
+            print("SoundFont not found in any standard location. Attempting to install/download...")
+            
+            if system == 'Linux':
+                try:
+                    print("Trying to install fluid-soundfont-gm package...")
+                    subprocess.run(['apt-get', 'update'], check=True)
+                    subprocess.run(['apt-get', 'install', '-y', 'fluid-soundfont-gm'], check=True)
+                    
+                    # Check if installation succeeded
+                    if os.path.exists('/usr/share/sounds/sf2/FluidR3_GM.sf2'):
+                        soundfont_path = '/usr/share/sounds/sf2/FluidR3_GM.sf2'
+                        soundfont_found = True
+                        print(f"SoundFont installed at {soundfont_path}")
+                except subprocess.CalledProcessError as e:
+                    print(f"Failed to install fluid-soundfont-gm: {e}")
+            
+            # If still not found or not on Linux, download it
+            if not soundfont_found:
+                print(f"Downloading SoundFont to {soundfont_path}...")
+                soundfont_found = download_soundfont(soundfont_path)
+    
+    # Final check - if we still don't have a SoundFont, we can't proceed
+    if not soundfont_found:
+        print("ERROR: Could not find or download a SoundFont file.")
+        print("Please download a SoundFont file manually and place it at:")
+        print(soundfont_path)
+        return None
+    
+    return soundfont_path
+
+@lru_cache(maxsize=1)
+def _read_custom_path():
+    """
+    Read the FluidSynth path configured in fluidsynth_path.txt, if any.
     
-    # Check for custom path in config file
-    custom_path = None
+    Returns:
+        str: Path from the config file, or None if there is none
+    """
     config_path = os.path.join(os.getcwd(), 'fluidsynth_path.txt')
     if os.path.exists(config_path):
         try:
             with open(config_path, 'r') as f:
                 custom_path = f.read().strip()
                 print(f"Found custom FluidSynth path in config: {custom_path}")
+                return custom_path or None
         except Exception as e:
             print(f"Error reading config file: {e}")
+    return None
+
+@lru_cache(maxsize=1)
+def _detect_tools():
+    """
+    Detect (installing if necessary) FluidSynth, ffmpeg and a SoundFont.
     
-    # Common FluidSynth installation paths on Windows
-    windows_fluidsynth_paths = [
-        # First check the custom path from config if available
-        custom_path,
-        # Prioritize the specific path mentioned by the user
-        'C:\\Program Files\\FluidSynth\\bin\\fluidsynth.exe',
-        # User directory installation (from local installer)
-        os.path.join(os.path.expanduser('~'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
-        # Other common paths as fallbacks
-        os.path.join(os.environ.get('ProgramFiles', 'C:\\Program Files'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
-        os.path.join(os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)'), 'FluidSynth', 'bin', 'fluidsynth.exe'),
-        os.path.join('C:\\tools', 'fluidsynth', 'bin', 'fluidsynth.exe'),
-        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'fluidsynth.exe')
-    ]
+    The result is cached, so the probing only happens once per process.
     
-    # Filter out None values
-    windows_fluidsynth_paths = [p for p in windows_fluidsynth_paths if p]
+    Returns:
+        tuple: (system, fluidsynth_binary_path, ffmpeg_installed, soundfont_path)
+               where fluidsynth_binary_path and soundfont_path are None if not found
+    """
+    import platform
     
-    try:
-        # Try the standard command first
-        subprocess.run(['fluidsynth', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Detect operating system
+    system = platform.system()
+    
+    # Check if FluidSynth is installed
+    fluidsynth_installed = False
+    fluidsynth_binary_path = None
+    
+    # First check the custom path from config if available
+    custom_path = _read_custom_path()
+    windows_fluidsynth_paths = (custom_path,) + WINDOWS_FLUIDSYNTH_PATHS if custom_path else WINDOWS_FLUIDSYNTH_PATHS
+    
+    # Look the command up on PATH without spawning it
+    fluidsynth_binary_path = shutil.which('fluidsynth')
+    if fluidsynth_binary_path:
         fluidsynth_installed = True
-        fluidsynth_binary_path = 'fluidsynth'  # Use command name directly
-    except FileNotFoundError:
+    else:
         # On Windows, check common installation paths
         if system == 'Windows':
             for path in windows_fluidsynth_paths:
@@ -336,8 +731,8 @@ def midi_to_mp3(midi_path):
                 try:
                     subprocess.run(['apt-get', 'update'], check=True)
                     subprocess.run(['apt-get', 'install', '-y', 'fluidsynth'], check=True)
-                    fluidsynth_installed = True
-                    fluidsynth_binary_path = 'fluidsynth'
+                    fluidsynth_binary_path = shutil.which('fluidsynth')
+                    fluidsynth_installed = fluidsynth_binary_path is not None
                 except Exception as e:
                     print(f"Failed to install FluidSynth: {e}")
             elif system == 'Windows':
@@ -377,18 +772,15 @@ def midi_to_mp3(midi_path):
                 print("brew install fluid-synth")
     
     # Check if ffmpeg is installed
-    ffmpeg_installed = False
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        ffmpeg_installed = True
-    except FileNotFoundError:
+    ffmpeg_installed = shutil.which('ffmpeg') is not None
+    if not ffmpeg_installed:
         print("ffmpeg not found. Installing...")
         
         if system == 'Linux':
             # Linux installation
             subprocess.run(['apt-get', 'update'], check=True)
             subprocess.run(['apt-get', 'install', '-y', 'ffmpeg'], check=True)
-            ffmpeg_installed = True
+            ffmpeg_installed = shutil.which('ffmpeg') is not None
         elif system == 'Windows':
             # Windows installation instructions
             print("Please install ffmpeg for Windows:")
@@ -398,77 +790,42 @@ def midi_to_mp3(midi_path):
             print("For macOS, install ffmpeg using Homebrew:")
             print("brew install ffmpeg")
     
-    # Check if SoundFont is available
-    soundfont_found = False
+    # Find (or install) a SoundFont
+    soundfont_path = find_soundfont(system)
     
-    # First check the specified path
-    if os.path.exists(soundfont_path) and os.path.getsize(soundfont_path) > 0:
-        print(f"SoundFont found at {soundfont_path}")
-        soundfont_found = True
-    else:
-        print(f"SoundFont not found at {soundfont_path}")
-        
-        # Check alternative locations based on OS
-        if system == 'Linux':
-            alternative_paths = [
-                '/usr/share/sounds/sf2/default.sf2',
-                '/usr/share/soundfonts/FluidR3_GM.sf2',
-                '/usr/share/soundfonts/default.sf2'
-            ]
-        elif system == 'Darwin':  # macOS
-            alternative_paths = [
-                '/usr/local/share/fluidsynth/soundfonts/FluidR3_GM.sf2',
-                '/usr/local/share/soundfonts/FluidR3_GM.sf2'
-            ]
-        elif system == 'Windows':
-            alternative_paths = [
-                os.path.join(os.environ.get('ProgramFiles', 'C:\\Program Files'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2'),
-                os.path.join(os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2'),
-                os.path.join(os.path.expanduser('~'), 'FluidSynth', 'share', 'soundfonts', 'FluidR3_GM.sf2')
-            ]
-        else:
-            alternative_paths = []
-        
-        # Check all alternative paths
-        for path in alternative_paths:
-            if os.path.exists(path) and os.path.getsize(path) > 0:
-                print(f"SoundFont found at alternative location: {path}")
-                soundfont_path = path
-                soundfont_found = True
-                break
+    return system, fluidsynth_binary_path if fluidsynth_installed else None, ffmpeg_installed, soundfont_path
+
+def midi_to_mp3(midi_path):
+    """
+    Convert a MIDI file to MP3 using FluidSynth and ffmpeg.
+    
+    Args:
+        midi_path (str): Path to the MIDI file
         
-        # If still not found, try to install or download
-        if not soundfont_found:
-            print("SoundFont not found in any standard location. Attempting to install/download...")
-            
-            if system == 'Linux':
-                try:
-                    print("Trying to install fluid-soundfont-gm package...")
-                    subprocess.run(['apt-get', 'update'], check=True)
-                    subprocess.run(['apt-get', 'install', '-y', 'fluid-soundfont-gm'], check=True)
-                    
-                    # Check if installation succeeded
-                    if os.path.exists('/usr/share/sounds/sf2/FluidR3_GM.sf2'):
-                        soundfont_path = '/usr/share/sounds/sf2/FluidR3_GM.sf2'
-                        soundfont_found = True
-                        print(f"SoundFont installed at {soundfont_path}")
-                except subprocess.CalledProcessError as e:
-                    print(f"Failed to install fluid-soundfont-gm: {e}")
-            
-            # If still not found or not on Linux, download it
-            if not soundfont_found:
-                print(f"Downloading SoundFont to {soundfont_path}...")
-                soundfont_found = download_soundfont(soundfont_path)
+    Returns:
+        str: Path to the created MP3 file
+    """
+    system, fluidsynth_binary_path, ffmpeg_installed, soundfont_path = _detect_tools()
+    fluidsynth_installed = fluidsynth_binary_path is not None
     
-    # Final check - if we still don't have a SoundFont, we can't proceed
-    if not soundfont_found:
-        print("ERROR: Could not find or download a SoundFont file.")
-        print("Please download a SoundFont file manually and place it at:")
-        print(soundfont_path)
+    # We can't proceed without a SoundFont
+    if soundfont_path is None:
+        # Look again on the next conversion
+        _detect_tools.cache_clear()
         return None  # Return None to indicate failure
     
-    # Create temporary WAV file
-    wav_path = os.path.join(tempfile.gettempdir(), 'generated_music.wav')
+    # Stream FluidSynth's PCM output straight into ffmpeg when both are there
+    if fluidsynth_binary_path and ffmpeg_installed:
+        mp3_path = midi_path.replace('.mid', '.mp3')
+        if _fluidsynth_to_mp3(fluidsynth_binary_path, soundfont_path, midi_path, mp3_path):
+            print(f"Successfully converted MIDI to MP3 using FluidSynth at {fluidsynth_binary_path}")
+            return mp3_path
+        print("Piping FluidSynth into ffmpeg failed, converting through a WAV file instead...")
+    
+    # Create temporary WAV file, named after the MIDI file so that
+    # concurrent conversions don't collide
+    wav_name = os.path.splitext(os.path.basename(midi_path))[0] + '.wav'
+    wav_path = os.path.join(tempfile.gettempdir(), wav_name)
     
     # Convert MIDI to WAV using FluidSynth
     if fluidsynth_installed and fluidsynth_binary_path:
@@ -532,6 +889,265 @@ def midi_to_mp3(midi_path):
     
     return mp3_path
 
+def _fluidsynth_to_mp3(fluidsynth_binary_path, soundfont_path, midi_path, mp3_path):
+    """
+    Convert a MIDI file to MP3 by piping FluidSynth's raw output into ffmpeg.
+    
+    Args:
+        fluidsynth_binary_path (str): Path to the FluidSynth executable
+        soundfont_path (str): Path to the SoundFont file
+        midi_path (str): Path to the MIDI file
+        mp3_path (str): Path where the MP3 file should be saved
+        
+    Returns:
+        bool: True if both processes succeeded
+    """
+    try:
+        # 16-bit little-endian stereo PCM on stdout
+        fs_proc = subprocess.Popen([
+            fluidsynth_binary_path,
+            '-ni', '-q',
+            '-T', 'raw', '-O', 's16', '-E', 'little',
+            '-F', '-',
+            '-r', '44100',
+            soundfont_path,
+            midi_path
+        ], stdout=subprocess.PIPE)
+    except OSError as e:
+        print(f"Error starting FluidSynth: {e}")
+        return False
+    
+    try:
+        ffmpeg_proc = subprocess.Popen([
+            'ffmpeg',
+            '-f', 's16le',
+            '-ar', '44100',
+            '-ac', '2',
+            '-i', '-',
+            '-codec:a', 'libmp3lame',
+            '-qscale:a', '2',
+            '-y',  # Overwrite output file if it exists
+            mp3_path
+        ], stdin=fs_proc.stdout)
+    except OSError as e:
+        print(f"Error starting ffmpeg: {e}")
+        fs_proc.kill()
+        fs_proc.wait()
+        return False
+    
+    # Leave ffmpeg as the only reader so FluidSynth stops if ffmpeg exits early
+    fs_proc.stdout.close()
+    ffmpeg_status = ffmpeg_proc.wait()
+    fluidsynth_status = fs_proc.wait()
+    return ffmpeg_status == 0 and fluidsynth_status == 0
+
+def midi_bytes_to_mp3(midi_bytes):
+    """
+    Convert in-memory MIDI data to MP3 data.
+    
+    Uses the same cached tool detection as midi_to_mp3(). With the FluidSynth
+    command-line program the MIDI data goes through a temporary file, which
+    FluidSynth renders straight into ffmpeg; otherwise the data is rendered
+    in memory with the Python FluidSynth library and the samples are piped
+    through ffmpeg.
+    
+    Args:
+        midi_bytes (bytes): Standard MIDI file contents
+        
+    Returns:
+        bytes: MP3 data, or None if conversion failed
+    """
+    system, fluidsynth_binary_path, ffmpeg_installed, soundfont_path = _detect_tools()
+    if soundfont_path is None:
+        # Look again on the next conversion
+        _detect_tools.cache_clear()
+        return None
+    if not ffmpeg_installed:
+        print("ERROR: ffmpeg not installed. Cannot encode MP3.")
+        return None
+    
+    if fluidsynth_binary_path:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            midi_path = os.path.join(tmp_dir, 'music.mid')
+            mp3_path = os.path.join(tmp_dir, 'music.mp3')
+            with open(midi_path, 'wb') as f:
+                f.write(midi_bytes)
+            if _fluidsynth_to_mp3(fluidsynth_binary_path, soundfont_path, midi_path, mp3_path):
+                with open(mp3_path, 'rb') as f:
+                    return f.read()
+        print("Piping FluidSynth into ffmpeg failed, trying the Python FluidSynth library...")
+    
+    try:
+        import fluidsynth
+        import mido
+    except ImportError as e:
+        print(f"ERROR: Missing required libraries for in-memory conversion: {e}")
+        print("Please install the required libraries with: pip install pyfluidsynth mido")
+        return None
+    
+    rendered = _render_with_pyfluidsynth(mido.MidiFile(file=io.BytesIO(midi_bytes)), soundfont_path)
+    if rendered is None:
+        return None
+    samples, sample_rate = rendered
+    
+    # Encode raw PCM from stdin to MP3 on stdout
+    try:
+        result = subprocess.run([
+            'ffmpeg',
+            '-f', 's16le',
+            '-ar', str(sample_rate),
+            '-ac', '2',
+            '-i', '-',
+            '-codec:a', 'libmp3lame',
+            '-qscale:a', '2',
+            '-f', 'mp3',
+            '-'
+        ], input=samples.tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        print(f"ERROR: Failed to encode MP3 with ffmpeg: {e}")
+        return None
+    
+    return result.stdout
+
+# Shared Python FluidSynth synth and its loaded SoundFont, created on first use
+_synth = None
+_synth_sfid = None
+_synth_soundfont = None
+_synth_lock = threading.Lock()
+
+def _get_synth(soundfont_path):
+    """
+    Get the shared Python FluidSynth synth with a SoundFont loaded.
+    
+    The synth is created once and the SoundFont is only reloaded when a
+    different path is requested. Callers must hold _synth_lock.
+    
+    Args:
+        soundfont_path (str): Path to the SoundFont file
+        
+    Returns:
+        tuple: (synth, sfid) of the shared synth and the loaded SoundFont ID
+    """
+    global _synth, _synth_sfid, _synth_soundfont
+    import fluidsynth
+    
+    if _synth is None:
+        # No audio driver is started, since the samples are pulled from the
+        # synth with get_samples()
+        _synth = fluidsynth.Synth(samplerate=44100.0)
+        print("FluidSynth initialized")
+    
+    if _synth_soundfont != soundfont_path:
+        if _synth_sfid is not None:
+            _synth.sfunload(_synth_sfid)
+            _synth_sfid = _synth_soundfont = None
+        
+        sfid = _synth.sfload(soundfont_path)
+        if sfid < 0:
+            raise RuntimeError(f"FluidSynth could not load {soundfont_path}")
+        _synth_sfid, _synth_soundfont = sfid, soundfont_path
+        print(f"Successfully loaded SoundFont (ID: {sfid})")
+    
+    return _synth, _synth_sfid
+
+def _render_with_pyfluidsynth(midi_file, soundfont_path):
+    """
+    Render a MIDI file to audio samples using the Python FluidSynth library.
+    
+    Args:
+        midi_file (mido.MidiFile): Loaded MIDI file
+        soundfont_path (str): Path to the SoundFont file
+        
+    Returns:
+        tuple: (samples, sample_rate) where samples is an (n, 2) int16 stereo
+               array, or None if rendering failed
+    """
+    sample_rate = 44100
+    
+    with _synth_lock:
+        # Load SoundFont
+        try:
+            fs, sfid = _get_synth(soundfont_path)
+        except Exception as e:
+            print(f"ERROR: Failed to load SoundFont: {e}")
+            return None
+        
+        try:
+            # Start from a clean state, whatever the previous render left playing
+            fs.system_reset()
+            
+            # Select program (instrument)
+            fs.program_select(0, sfid, 0, 0)
+            
+            midi_path = getattr(midi_file, 'filename', None)
+            if midi_path and hasattr(fs, 'play_midi_file'):
+                # Let FluidSynth's own MIDI player drive the synth and render the
+                # whole file, plus a second for the last notes to ring out, in one call
+                print(f"Processing MIDI file: {midi_file.length:.2f} seconds of audio")
+                fs.play_midi_file(midi_path)
+                samples = fs.get_samples(int(midi_file.length * sample_rate) + sample_rate).reshape(-1, 2)
+                fs.play_midi_stop()
+            else:
+                samples = _render_midi_events(fs, midi_file, sample_rate)
+            
+            return samples, sample_rate
+            
+        except Exception as e:
+            print(f"ERROR during MIDI processing: {e}")
+            return None
+
+def _render_midi_events(fs, midi_file, sample_rate):
+    """
+    Render a MIDI file by feeding its messages to the synth one by one.
+    
+    Used when the MIDI file isn't on disk or the FluidSynth library has no
+    MIDI player.
+    
+    Args:
+        fs (fluidsynth.Synth): Synth with the SoundFont loaded
+        midi_file (mido.MidiFile): Loaded MIDI file
+        sample_rate (int): Sample rate in Hz
+        
+    Returns:
+        numpy.ndarray: (n, 2) int16 stereo samples
+    """
+    # Iterating a MidiFile yields delta times in seconds, so its length is
+    # the total duration; allocate once with a 1 second buffer
+    duration_sec = midi_file.length
+    samples = np.zeros((int(duration_sec * sample_rate) + sample_rate, 2), dtype=np.int16)
+    
+    print(f"Processing MIDI file: {duration_sec:.2f} seconds of audio")
+    
+    # Collect the note events with their absolute sample position; other
+    # messages don't need a render boundary of their own
+    events = []
+    current_time = 0.0
+    for msg in midi_file:
+        current_time += msg.time
+        if msg.type == 'note_on' or msg.type == 'note_off':
+            events.append((int(current_time * sample_rate), msg))
+    
+    # Render only when the time advances, so all events sharing a sample
+    # position are applied before one get_samples() call covering the gap
+    pos = 0
+    for event_pos, msg in events:
+        event_pos = min(event_pos, len(samples))
+        if event_pos > pos:
+            # get_samples returns interleaved stereo frames
+            samples[pos:event_pos] = fs.get_samples(event_pos - pos).reshape(-1, 2)
+            pos = event_pos
+        
+        if msg.type == 'note_on':
+            fs.noteon(msg.channel, msg.note, msg.velocity)
+        else:
+            fs.noteoff(msg.channel, msg.note)
+    
+    # Let the last notes ring out into the buffer
+    if pos < len(samples):
+        samples[pos:] = fs.get_samples(len(samples) - pos).reshape(-1, 2)
+    
+    return samples
+
 def convert_midi_to_wav_with_pyfluidsynth(midi_path, wav_path, soundfont_path):
     """
     Convert MIDI to WAV using the Python FluidSynth library.
@@ -547,7 +1163,6 @@ def convert_midi_to_wav_with_pyfluidsynth(midi_path, wav_path, soundfont_path):
     try:
         import fluidsynth
         import mido
-        import numpy as np
         from scipy.io import wavfile
         
         print(f"Using Python FluidSynth library to convert MIDI to WAV")
@@ -572,80 +1187,16 @@ def convert_midi_to_wav_with_pyfluidsynth(midi_path, wav_path, soundfont_path):
             print(f"ERROR: Failed to load MIDI file: {e}")
             return False
         
-        # Initialize FluidSynth
-        fs = fluidsynth.Synth()
-        fs.start()
-        print("FluidSynth initialized")
-        
-        # Load SoundFont
-        try:
-            sfid = fs.sfload(soundfont_path)
-            print(f"Successfully loaded SoundFont (ID: {sfid})")
-        except Exception as e:
-            print(f"ERROR: Failed to load SoundFont: {e}")
-            fs.delete()
-            return False
-            
-        try:
-            # Select program (instrument)
-            fs.program_select(0, sfid, 0, 0)
-            
-            # Process MIDI events
-            sample_rate = 44100
-            
-            # Calculate total time
-            total_time = 0
-            for track in midi_file.tracks:
-                track_time = sum(msg.time for msg in track)
-                total_time = max(total_time, track_time)
-            total_time *= midi_file.ticks_per_beat
-            
-            # Create sample array with extra buffer
-            buffer_size = int(total_time * sample_rate / 1000) + sample_rate  # Add 1 second buffer
-            samples = np.zeros(buffer_size, dtype=np.int16)
-            
-            print(f"Processing MIDI file: {total_time/1000:.2f} seconds of audio")
-            
-            current_time = 0
-            for msg in midi_file:
-                if msg.type == 'note_on':
-                    fs.noteon(msg.channel, msg.note, msg.velocity)
-                elif msg.type == 'note_off':
-                    fs.noteoff(msg.channel, msg.note)
-                
-                # Render audio for this time step
-                if msg.time > 0:
-                    current_time += msg.time
-                    start_idx = int((current_time - msg.time) * sample_rate / 1000)
-                    end_idx = int(current_time * sample_rate / 1000)
-                    
-                    # Make sure we don't go out of bounds
-                    if end_idx > len(samples):
-                        # Extend the samples array if needed
-                        samples = np.pad(samples, (0, end_idx - len(samples) + 1000), 'constant')
-                    
-                    chunk = fs.get_samples(end_idx - start_idx)
-                    
-                    # Make sure chunk fits in the target range
-                    if len(chunk) > (end_idx - start_idx):
-                        chunk = chunk[:(end_idx - start_idx)]
-                    elif len(chunk) < (end_idx - start_idx):
-                        chunk = np.pad(chunk, (0, (end_idx - start_idx) - len(chunk)), 'constant')
-                    
-                    samples[start_idx:end_idx] = chunk
-            
-            # Save as WAV
-            wavfile.write(wav_path, sample_rate, samples)
-            print(f"Successfully wrote WAV file: {wav_path}")
-            
-            # Clean up
-            fs.delete()
-            return True
-            
-        except Exception as e:
-            print(f"ERROR during MIDI processing: {e}")
-            fs.delete()
+        # Render audio
+        rendered = _render_with_pyfluidsynth(midi_file, soundfont_path)
+        if rendered is None:
             return False
+        samples, sample_rate = rendered
+        
+        # Save as WAV
+        wavfile.write(wav_path, sample_rate, samples)
+        print(f"Successfully wrote WAV file: {wav_path}")
+        return True
             
     except ImportError as e:
         print(f"ERROR: Missing required libraries for MIDI to WAV conversion: {e}")
@@ -779,6 +1330,54 @@ pause
     
     return admin_batch_path, local_batch_path
 
+# SHA-256 digest a downloaded SoundFont must match, or None to accept any
+# complete download
+SOUNDFONT_SHA256 = None
+
+class _HashReader:
+    """File-like wrapper that hashes everything read through it."""
+    
+    def __init__(self, raw, sha256=None):
+        self.raw = raw
+        self.sha256 = sha256 or hashlib.sha256()
+    
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        return data
+
+def _hash_file(path):
+    """
+    Compute the SHA-256 of a file.
+    
+    Args:
+        path (str): Path of the file
+        
+    Returns:
+        hashlib object: Hash of the file's contents, to be continued by the caller
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            sha256.update(chunk)
+    return sha256
+
+def _digest_ok(digest, url):
+    """
+    Check a downloaded SoundFont's digest against SOUNDFONT_SHA256.
+    
+    Args:
+        digest (str): Hex SHA-256 of the download
+        url (str): Where the file came from, for the log message
+        
+    Returns:
+        bool: True if the digest matches or no digest is known
+    """
+    if SOUNDFONT_SHA256 is None or digest == SOUNDFONT_SHA256:
+        return True
+    print(f"SoundFont from {url} has SHA-256 {digest}, expected {SOUNDFONT_SHA256}")
+    return False
+
 def download_soundfont(soundfont_path):
     """
     Download a SoundFont file from the internet.
@@ -789,12 +1388,6 @@ def download_soundfont(soundfont_path):
     Returns:
         bool: True if download was successful, False otherwise
     """
-    import requests
-    import shutil
-    
-    print("Downloading SoundFont file...")
-    print(f"Target path: {soundfont_path}")
-    
     # Primary URL
     soundfont_url = "https://archive.org/download/fluidr3-gm-gs/FluidR3_GM.sf2"
     
@@ -807,43 +1400,333 @@ def download_soundfont(soundfont_path):
     # Try the primary URL first, then the backups
     all_urls = [soundfont_url] + backup_urls
     
+    # One session for all sequential attempts, so connections are reused
+    session = _make_session()
+    try:
+        # Fetch parts of the file from all mirrors at once, then fall back to
+        # trying them one by one
+        if _download_parallel(session, all_urls, soundfont_path):
+            return True
+        if _download_from_urls(session, all_urls, soundfont_path):
+            return True
+    finally:
+        session.close()
+    
+    # If we get here, all URLs failed
+    print("All download attempts failed.")
+    print("Please download the SoundFont manually from one of these URLs:")
     for url in all_urls:
+        print(f"- {url}")
+    print(f"And save it to: {soundfont_path}")
+    return False
+
+def _make_session():
+    """
+    Create an HTTP session for downloading the SoundFont.
+    
+    Connections are reused within the session and transient server errors
+    are retried by urllib3. Sessions aren't shared between threads.
+    
+    Returns:
+        requests.Session: The session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                          max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)))
+    session.mount('https://', adapter)
+    return session
+
+def _query_mirror(session, url):
+    """
+    Ask a mirror for the size and ETag of its file.
+    
+    Args:
+        session (requests.Session): Session used for the request
+        url (str): URL of the file
+        
+    Returns:
+        tuple: (size, etag), or None if the mirror can't serve byte ranges
+    """
+    try:
+        response = session.head(url, allow_redirects=True, timeout=(5, 30))
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Could not query {url}: {e}")
+        return None
+    total_size = int(response.headers.get('content-length', 0))
+    if not total_size or response.headers.get('accept-ranges', '').lower() != 'bytes':
+        return None
+    # Weak ETags can't be used with If-Range
+    etag = response.headers.get('etag')
+    return total_size, etag if etag and not etag.startswith('W/') else None
+
+def _download_parallel(session, urls, soundfont_path):
+    """
+    Download a SoundFont file as disjoint byte ranges from several mirrors at once.
+    
+    Ranges are only combined from mirrors that serve the same file: either
+    SOUNDFONT_SHA256 is set and checked, or the mirrors report the same
+    strong ETag and size as the primary mirror. Each mirror fetches one
+    range on its own thread and session; a range that fails is retried on
+    the next mirror.
+    
+    Args:
+        session (requests.Session): Session used to query the mirrors
+        urls (list): Mirror URLs of the same file
+        soundfont_path (str): Path where the SoundFont file should be saved
+        
+    Returns:
+        bool: True if download was successful, False if the sequential
+              download should be used instead
+    """
+    # Leave an interrupted sequential download to be resumed
+    if os.path.exists(soundfont_path + '.part'):
+        return False
+    
+    # Learn the size, and whether ranges are supported, from the primary mirror
+    primary = _query_mirror(session, urls[0])
+    if primary is None:
+        return False
+    total_size, etag = primary
+    if SOUNDFONT_SHA256 is None and etag is None:
+        return False
+    
+    # Use the mirrors that provably serve the same file, each with its own ETag
+    etags = {urls[0]: etag}
+    for url in urls[1:]:
+        mirror = _query_mirror(session, url)
+        if mirror is not None and mirror[0] == total_size and (SOUNDFONT_SHA256 is not None or mirror[1] == etag):
+            etags[url] = mirror[1]
+    if len(etags) < 2:
+        return False
+    urls = list(etags)
+    
+    print(f"Downloading SoundFont to {soundfont_path} ({total_size / (1024 * 1024):.2f} MB) "
+          f"from {len(urls)} mirrors in parallel")
+    os.makedirs(os.path.dirname(soundfont_path), exist_ok=True)
+    
+    # Split [0, total_size) into one range per mirror
+    bounds = [total_size * k // len(urls) for k in range(len(urls) + 1)]
+    ranges = [(k, bounds[k], bounds[k + 1]) for k in range(len(urls)) if bounds[k] < bounds[k + 1]]
+    range_paths = [f"{soundfont_path}.part{k}" for k in range(len(urls))]
+    
+    def fetch(k, start, end):
+        # Try the range's own mirror first, then the others
+        with _make_session() as range_session:
+            for attempt in range(len(urls)):
+                url = urls[(k + attempt) % len(urls)]
+                try:
+                    _fetch_range(range_session, url, start, end, total_size, range_paths[k], etags[url])
+                    return True
+                except Exception as e:
+                    print(f"Error downloading bytes {start}-{end - 1} from {url}: {e}")
+        return False
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            done = list(pool.map(lambda r: fetch(*r), ranges))
+        if not all(done):
+            return False
+        
+        # Reassemble the parts, hashing them on the way
+        sha256 = hashlib.sha256()
+        with open(soundfont_path + '.part', 'wb') as f:
+            for k, _, _ in ranges:
+                with open(range_paths[k], 'rb') as part:
+                    shutil.copyfileobj(_HashReader(part, sha256), f, length=1 << 20)
+        if not _digest_ok(sha256.hexdigest(), ', '.join(urls)):
+            os.remove(soundfont_path + '.part')
+            return False
+        os.replace(soundfont_path + '.part', soundfont_path)
+    finally:
+        for path in range_paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    print(f"SoundFont successfully downloaded to {soundfont_path}")
+    return True
+
+def _fetch_range(session, url, start, end, total_size, path, etag=None):
+    """
+    Download bytes [start, end) of a file into a separate file.
+    
+    Args:
+        session (requests.Session): Session used for the request
+        url (str): URL of the file
+        start (int): First byte to download
+        end (int): End of the range (exclusive)
+        total_size (int): Expected size of the whole file
+        path (str): Path where the range should be saved
+        etag (str, optional): ETag the file must still have
+        
+    Raises:
+        ValueError: If the server doesn't return exactly the requested range
+    """
+    headers = {'Range': f'bytes={start}-{end - 1}'}
+    if etag is not None:
+        # A changed file is sent whole, which is rejected below
+        headers['If-Range'] = etag
+    with session.get(url, stream=True, timeout=(5, 30), headers=headers) as response:
+        response.raise_for_status()
+        content_range = response.headers.get('content-range', '')
+        if response.status_code != 206 or content_range != f'bytes {start}-{end - 1}/{total_size}':
+            raise ValueError(f"Server did not return the requested range (got {content_range or response.status_code})")
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1 << 20)
+    if os.path.getsize(path) != end - start:
+        raise ValueError("Range download was incomplete")
+
+def _download_from_urls(session, urls, soundfont_path):
+    """
+    Download a SoundFont file from the first URL that works.
+    
+    An interrupted download is only resumed from the URL it came from, and
+    only while that server still has the same file.
+    
+    Args:
+        session (requests.Session): Session used for the requests
+        urls (list): URLs to try, in order
+        soundfont_path (str): Path where the SoundFont file should be saved
+        
+    Returns:
+        bool: True if download was successful, False otherwise
+    """
+    # Download into a partial file, so an interrupted download is never
+    # mistaken for a SoundFont; the URL, validator and size it came from
+    # are kept next to it
+    part_path = soundfont_path + '.part'
+    info_path = part_path + '.json'
+    
+    # Try the URL of a previous partial download first, so it can be resumed
+    part_info = _read_part_info(info_path)
+    if part_info and part_info.get('url') in urls:
+        urls = [part_info['url']] + [url for url in urls if url != part_info['url']]
+    
+    for url in urls:
         try:
-            print(f"Trying to download from: {url}")
-            
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(soundfont_path), exist_ok=True)
             
+            # Continue where a previous attempt on this URL stopped, unless
+            # the file changed since (If-Range makes the server send it whole)
+            part_info = _read_part_info(info_path)
+            existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if existing and part_info and part_info.get('url') == url and part_info.get('validator'):
+                headers = {'Range': f'bytes={existing}-', 'If-Range': part_info['validator']}
+            else:
+                existing = 0
+                headers = {}
+            
             # Download with progress reporting
-            with requests.get(url, stream=True) as response:
-                response.raise_for_status()  # Raise an exception for HTTP errors
-                
-                # Get total file size if available
-                total_size = int(response.headers.get('content-length', 0))
-                if total_size:
-                    print(f"File size: {total_size / (1024 * 1024):.2f} MB")
-                
-                # Download and save the file
-                with open(soundfont_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            with session.get(url, stream=True, timeout=(5, 30), headers=headers) as response:
+                if response.status_code == 416:
+                    # Nothing left to fetch if the partial file is already complete
+                    total_size = _content_range_total(response.headers.get('content-range'))
+                    if not existing or total_size != existing or total_size != part_info.get('size'):
+                        raise ValueError(f"Server rejected resuming at byte {existing}")
+                    sha256 = _hash_file(part_path)
+                else:
+                    response.raise_for_status()  # Raise an exception for HTTP errors
+                    
+                    if response.status_code == 206:
+                        total_size = _content_range_total(response.headers.get('content-range'))
+                        if (not response.headers.get('content-range', '').startswith(f'bytes {existing}-')
+                                or total_size != part_info.get('size')):
+                            raise ValueError("Server returned an unexpected byte range")
+                        mode = 'ab'
+                        sha256 = _hash_file(part_path)
+                    else:
+                        # The server sent the whole file, start over
+                        total_size = int(response.headers.get('content-length', 0)) or None
+                        mode = 'wb'
+                        sha256 = hashlib.sha256()
+                        validator = response.headers.get('etag') or response.headers.get('last-modified')
+                        _write_part_info(info_path, url, validator, total_size)
+                    
+                    size_mb = f"{total_size / (1024 * 1024):.2f}" if total_size else "?"
+                    print(f"Downloading SoundFont from {url} to {soundfont_path} "
+                          f"({size_mb} MB, starting at byte {existing if mode == 'ab' else 0})")
+                    
+                    # Download and save the file, copying 1 MiB at a time and
+                    # hashing it as it streams past
+                    response.raw.decode_content = True
+                    with open(part_path, mode) as f:
+                        shutil.copyfileobj(_HashReader(response.raw, sha256), f, length=1 << 20)
             
             # Verify the file was downloaded
-            if os.path.exists(soundfont_path) and os.path.getsize(soundfont_path) > 0:
+            size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size > 0 and (total_size is None or size == total_size):
+                if not _digest_ok(sha256.hexdigest(), url):
+                    # Corrupt, don't resume from it
+                    _remove_partial(part_path, info_path)
+                    continue
+                os.replace(part_path, soundfont_path)
+                _remove_partial(info_path)
                 print(f"SoundFont successfully downloaded to {soundfont_path}")
-                print(f"File size: {os.path.getsize(soundfont_path) / (1024 * 1024):.2f} MB")
                 return True
             else:
-                print("Downloaded file is empty or not found. Trying next URL...")
+                print(f"Download from {url} is incomplete or empty. Trying next URL...")
                 
         except Exception as e:
             print(f"Error downloading from {url}: {e}")
             print("Trying next URL...")
     
-    # If we get here, all URLs failed
-    print("All download attempts failed.")
-    print("Please download the SoundFont manually from one of these URLs:")
-    for url in all_urls:
-        print(f"- {url}")
-    print(f"And save it to: {soundfont_path}")
     return False
+
+def _read_part_info(info_path):
+    """
+    Read where a partial SoundFont download came from.
+    
+    Args:
+        info_path (str): Path of the information file
+        
+    Returns:
+        dict: {'url': ..., 'validator': ..., 'size': ...}, or None if there is no valid information
+    """
+    try:
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return info if isinstance(info, dict) else None
+
+def _write_part_info(info_path, url, validator, size):
+    """
+    Record where a partial SoundFont download comes from.
+    
+    Args:
+        info_path (str): Path of the information file
+        url (str): URL the download comes from
+        validator (str): ETag or Last-Modified sent by the server, or None
+        size (int): Size of the whole file in bytes, or None if unknown
+    """
+    with open(info_path, 'w') as f:
+        json.dump({'url': url, 'validator': validator, 'size': size}, f)
+
+def _remove_partial(*paths):
+    """
+    Delete the files of a partial download, if they exist.
+    
+    Args:
+        *paths (str): Paths of the files
+    """
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _content_range_total(content_range):
+    """
+    Get the total size from a Content-Range header.
+    
+    Args:
+        content_range (str): Header value (e.g., 'bytes 100-199/1000')
+        
+    Returns:
+        int: Total size in bytes, or None if unknown
+    """
+    total = content_range.rpartition('/')[2] if content_range else '*'
+    return int(total) if total.isdigit() else None
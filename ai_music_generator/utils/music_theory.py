@@ -3,46 +3,54 @@ Music theory utilities for the AI Music Generator.
 """
 
 import re
+from functools import lru_cache
+from types import MappingProxyType
 
 # Define note to MIDI number mapping
-NOTE_TO_MIDI = {
+NOTE_TO_MIDI = MappingProxyType({
     'C': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3,
     'E': 4, 'F': 5, 'F#': 6, 'Gb': 6, 'G': 7, 'G#': 8,
     'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10, 'B': 11
-}
+})
 
 # Define scale patterns (semitone intervals)
-SCALE_PATTERNS = {
-    'Major': [0, 2, 4, 5, 7, 9, 11],
-    'Minor': [0, 2, 3, 5, 7, 8, 10],
-    'Dorian': [0, 2, 3, 5, 7, 9, 10],
-    'Phrygian': [0, 1, 3, 5, 7, 8, 10],
-    'Lydian': [0, 2, 4, 6, 7, 9, 11],
-    'Mixolydian': [0, 2, 4, 5, 7, 9, 10],
-    'Locrian': [0, 1, 3, 5, 6, 8, 10],
-    'Blues': [0, 3, 5, 6, 7, 10],
-    'Pentatonic Major': [0, 2, 4, 7, 9],
-    'Pentatonic Minor': [0, 3, 5, 7, 10],
-}
+SCALE_PATTERNS = MappingProxyType({
+    'Major': (0, 2, 4, 5, 7, 9, 11),
+    'Minor': (0, 2, 3, 5, 7, 8, 10),
+    'Dorian': (0, 2, 3, 5, 7, 9, 10),
+    'Phrygian': (0, 1, 3, 5, 7, 8, 10),
+    'Lydian': (0, 2, 4, 6, 7, 9, 11),
+    'Mixolydian': (0, 2, 4, 5, 7, 9, 10),
+    'Locrian': (0, 1, 3, 5, 6, 8, 10),
+    'Blues': (0, 3, 5, 6, 7, 10),
+    'Pentatonic Major': (0, 2, 4, 7, 9),
+    'Pentatonic Minor': (0, 3, 5, 7, 10),
+})
 
 # Define chord patterns (semitone intervals from root)
-CHORD_PATTERNS = {
-    'Major': [0, 4, 7],
-    'Minor': [0, 3, 7],
-    'Diminished': [0, 3, 6],
-    'Augmented': [0, 4, 8],
-    'Sus2': [0, 2, 7],
-    'Sus4': [0, 5, 7],
-    'Major 7': [0, 4, 7, 11],
-    'Minor 7': [0, 3, 7, 10],
-    'Dominant 7': [0, 4, 7, 10],
-    'Diminished 7': [0, 3, 6, 9],
-    'Half Diminished 7': [0, 3, 6, 10],
-    'Augmented 7': [0, 4, 8, 10],
-}
+CHORD_PATTERNS = MappingProxyType({
+    'Major': (0, 4, 7),
+    'Minor': (0, 3, 7),
+    'Diminished': (0, 3, 6),
+    'Augmented': (0, 4, 8),
+    'Sus2': (0, 2, 7),
+    'Sus4': (0, 5, 7),
+    'Major 7': (0, 4, 7, 11),
+    'Minor 7': (0, 3, 7, 10),
+    'Dominant 7': (0, 4, 7, 10),
+    'Diminished 7': (0, 3, 6, 9),
+    'Half Diminished 7': (0, 3, 6, 10),
+    'Augmented 7': (0, 4, 8, 10),
+})
+
+# Note names by pitch class (sharps)
+_NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+# Note names with octave numbers of every MIDI number (e.g., _MIDI_NAMES[60] == 'C4')
+_MIDI_NAMES = tuple(f"{_NOTE_NAMES[midi_num % 12]}{midi_num // 12 - 1}" for midi_num in range(128))
 
 # Define chord symbols to chord types mapping
-CHORD_SYMBOLS = {
+CHORD_SYMBOLS = MappingProxyType({
     'I': 'Major',
     'i': 'Minor',
     'II': 'Major',
@@ -62,22 +70,104 @@ CHORD_SYMBOLS = {
     'bV': 'Major',
     'bVI': 'Major',
     'bVII': 'Major',
-}
+})
+
+# Roman numeral characters of a chord symbol, and everything else (modifiers)
+_NON_ROMAN = re.compile(r'[^IViv]')
+_ROMAN = re.compile(r'[IViv]')
+
+def _split_symbol(symbol):
+    """
+    Split a chord symbol into its scale degree and modifiers.
+    
+    Args:
+        symbol (str): Chord symbol (e.g., 'V', 'bVII', 'ii7')
+        
+    Returns:
+        tuple: (scale_degree, modifiers)
+    """
+    return _NON_ROMAN.sub('', symbol), _ROMAN.sub('', symbol)
+
+# Scale degree and modifiers of every known chord symbol
+_SYMBOL_PARTS = MappingProxyType({symbol: _split_symbol(symbol) for symbol in CHORD_SYMBOLS})
 
 # Define scale degree to semitone mapping for major and minor scales
-SCALE_DEGREE_TO_SEMITONE = {
-    'Major': {
+SCALE_DEGREE_TO_SEMITONE = MappingProxyType({
+    'Major': MappingProxyType({
         'I': 0, 'II': 2, 'III': 4, 'IV': 5, 'V': 7, 'VI': 9, 'VII': 11,
         'i': 0, 'ii': 2, 'iii': 4, 'iv': 5, 'v': 7, 'vi': 9, 'vii': 11,
         'bII': 1, 'bIII': 3, 'bV': 6, 'bVI': 8, 'bVII': 10,
-    },
-    'Minor': {
+    }),
+    'Minor': MappingProxyType({
         'I': 0, 'II': 2, 'III': 3, 'IV': 5, 'V': 7, 'VI': 8, 'VII': 10,
         'i': 0, 'ii': 2, 'iii': 3, 'iv': 5, 'v': 7, 'vi': 8, 'vii': 10,
         'bII': 1, 'bIII': 2, 'bV': 6, 'bVI': 7, 'bVII': 9,
-    }
-}
+    }),
+})
+
+# Scale degrees that form a diminished chord in a major scale
+_DIMINISHED_DEGREES = frozenset({'vii', 'VII'})
 
+def _base_chord_type(scale_degree, scale_mode):
+    """
+    Determine the chord type of a scale degree, before modifiers.
+    
+    Args:
+        scale_degree (str): Roman numeral (e.g., 'V', 'ii')
+        scale_mode (str): 'Major' or 'Minor'
+        
+    Returns:
+        str: Chord type
+    """
+    if scale_degree in _DIMINISHED_DEGREES and scale_mode == 'Major':
+        return 'Diminished'
+    elif scale_degree.islower():
+        return 'Minor'
+    else:
+        return 'Major'
+
+# Chord type of every known scale degree, per scale mode
+_BASE_CHORD_TYPES = MappingProxyType({
+    scale_mode: MappingProxyType({degree: _base_chord_type(degree, scale_mode) for degree in degrees})
+    for scale_mode, degrees in SCALE_DEGREE_TO_SEMITONE.items()
+})
+
+# Chord type of a chord with a '7' modifier
+_SEVENTH_CHORD_TYPES = MappingProxyType({
+    'Major': 'Dominant 7',
+    'Minor': 'Minor 7',
+    'Diminished': 'Diminished 7',
+})
+
+# Define common chord progressions for different genres
+CHORD_PROGRESSIONS = MappingProxyType({
+    'Pop': (
+        ('I', 'V', 'vi', 'IV'),  # Most common pop progression
+        ('I', 'IV', 'V'),         # Simple pop progression
+        ('vi', 'IV', 'I', 'V'),   # Pop progression starting on vi
+    ),
+    'Rock': (
+        ('I', 'IV', 'V'),         # Classic rock progression
+        ('I', 'V', 'IV'),         # Rock progression
+        ('I', 'bVII', 'IV'),      # Rock progression with flat VII
+        ('i', 'bVI', 'bVII'),     # Minor rock progression
+    ),
+    'Jazz': (
+        ('ii', 'V', 'I'),         # Classic jazz progression
+        ('I', 'vi', 'ii', 'V'),   # Jazz turnaround
+        ('iii', 'VI', 'ii', 'V'),  # Jazz progression
+    ),
+    'Classical': (
+        ('I', 'IV', 'V', 'I'),    # Classical cadence
+        ('I', 'ii', 'V', 'I'),    # Classical progression
+        ('vi', 'ii', 'V', 'I'),   # Classical progression starting on vi
+    ),
+    'Blues': (
+        ('I', 'IV', 'I', 'V', 'IV', 'I'),  # 12-bar blues (simplified)
+    ),
+})
+
+@lru_cache(maxsize=512)
 def note_to_midi(note, octave=4):
     """
     Convert a note name to MIDI number.
@@ -89,11 +179,12 @@ def note_to_midi(note, octave=4):
     Returns:
         int: MIDI number
     """
-    if note in NOTE_TO_MIDI:
-        return NOTE_TO_MIDI[note] + (octave + 1) * 12
-    else:
+    note_num = NOTE_TO_MIDI.get(note)
+    if note_num is None:
         raise ValueError(f"Invalid note: {note}")
+    return note_num + (octave + 1) * 12
 
+@lru_cache(maxsize=512)
 def midi_to_note(midi_num):
     """
     Convert a MIDI number to note name and octave.
@@ -108,10 +199,25 @@ def midi_to_note(midi_num):
     note_num = midi_num % 12
     
     # Use sharps by default
-    notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    return _NOTE_NAMES[note_num], octave
+
+def _midi_to_note_names(root_midi, intervals):
+    """
+    Get the note names, with octave numbers, of intervals above a root.
     
-    return notes[note_num], octave
+    Args:
+        root_midi (int): MIDI number of the root
+        intervals (tuple): Semitone intervals from the root
+        
+    Returns:
+        tuple: Note names with octave numbers (e.g., 'C#4')
+    """
+    if root_midi + min(intervals) < 0 or root_midi + max(intervals) > 127:
+        raise ValueError(f"MIDI numbers out of range: {[root_midi + i for i in intervals]}")
+    
+    return tuple([_MIDI_NAMES[root_midi + i] for i in intervals])
 
+@lru_cache(maxsize=512)
 def parse_scale(scale_str):
     """
     Parse a scale string into root note and scale type.
@@ -122,21 +228,23 @@ def parse_scale(scale_str):
     Returns:
         tuple: (root_note, scale_type)
     """
-    parts = scale_str.split()
-    if len(parts) < 2:
-        raise ValueError(f"Invalid scale format: {scale_str}. Expected format: 'C Major'")
-    
-    root_note = parts[0]
-    scale_type = ' '.join(parts[1:])
-    
-    if root_note not in NOTE_TO_MIDI:
-        raise ValueError(f"Invalid root note: {root_note}")
-    
-    if scale_type not in SCALE_PATTERNS:
-        raise ValueError(f"Invalid scale type: {scale_type}")
+    root_note, _, scale_type = scale_str.partition(' ')
+    if root_note not in NOTE_TO_MIDI or scale_type not in SCALE_PATTERNS:
+        # Not in canonical form, normalize the whitespace
+        root_note, _, scale_type = ' '.join(scale_str.split()).partition(' ')
+        
+        if not scale_type:
+            raise ValueError(f"Invalid scale format: {scale_str}. Expected format: 'C Major'")
+        
+        if root_note not in NOTE_TO_MIDI:
+            raise ValueError(f"Invalid root note: {root_note}")
+        
+        if scale_type not in SCALE_PATTERNS:
+            raise ValueError(f"Invalid scale type: {scale_type}")
     
     return root_note, scale_type
 
+@lru_cache(maxsize=512)
 def get_scale_notes(scale_str, octave=4):
     """
     Get the notes in a scale.
@@ -146,19 +254,14 @@ def get_scale_notes(scale_str, octave=4):
         octave (int): Base octave
         
     Returns:
-        list: List of notes in the scale with octave numbers
+        tuple: Notes in the scale with octave numbers
     """
     root_note, scale_type = parse_scale(scale_str)
     root_midi = note_to_midi(root_note, octave)
     
-    scale_notes = []
-    for interval in SCALE_PATTERNS[scale_type]:
-        midi_num = root_midi + interval
-        note, note_octave = midi_to_note(midi_num)
-        scale_notes.append(f"{note}{note_octave}")
-    
-    return scale_notes
+    return _midi_to_note_names(root_midi, SCALE_PATTERNS[scale_type])
 
+@lru_cache(maxsize=512)
 def get_chord_progression(genre, scale_str):
     """
     Get a chord progression for a genre in a specific scale.
@@ -168,91 +271,46 @@ def get_chord_progression(genre, scale_str):
         scale_str (str): Scale string (e.g., 'C Major', 'A Minor')
         
     Returns:
-        list: List of chord names
+        tuple: Chord names
     """
     root_note, scale_type = parse_scale(scale_str)
-    
-    # Define common chord progressions for different genres
-    progressions = {
-        'Pop': [
-            ['I', 'V', 'vi', 'IV'],  # Most common pop progression
-            ['I', 'IV', 'V'],         # Simple pop progression
-            ['vi', 'IV', 'I', 'V'],   # Pop progression starting on vi
-        ],
-        'Rock': [
-            ['I', 'IV', 'V'],         # Classic rock progression
-            ['I', 'V', 'IV'],         # Rock progression
-            ['I', 'bVII', 'IV'],      # Rock progression with flat VII
-            ['i', 'bVI', 'bVII'],     # Minor rock progression
-        ],
-        'Jazz': [
-            ['ii', 'V', 'I'],         # Classic jazz progression
-            ['I', 'vi', 'ii', 'V'],   # Jazz turnaround
-            ['iii', 'VI', 'ii', 'V'],  # Jazz progression
-        ],
-        'Classical': [
-            ['I', 'IV', 'V', 'I'],    # Classical cadence
-            ['I', 'ii', 'V', 'I'],    # Classical progression
-            ['vi', 'ii', 'V', 'I'],   # Classical progression starting on vi
-        ],
-        'Blues': [
-            ['I', 'IV', 'I', 'V', 'IV', 'I'],  # 12-bar blues (simplified)
-        ],
-    }
+    root_pc = NOTE_TO_MIDI[root_note]
     
     # Get a progression for the genre
-    if genre in progressions:
-        progression = progressions[genre][0]  # Use the first progression for simplicity
-    else:
-        # Default to pop progression
-        progression = progressions['Pop'][0]
+    # (use the first progression for simplicity, default to pop progression)
+    progression = (CHORD_PROGRESSIONS.get(genre) or CHORD_PROGRESSIONS['Pop'])[0]
+    
+    # Determine if it's a major or minor scale
+    scale_mode = 'Major' if scale_type == 'Major' else 'Minor'
+    semitones = SCALE_DEGREE_TO_SEMITONE[scale_mode]
+    base_chord_types = _BASE_CHORD_TYPES[scale_mode]
     
     # Convert chord symbols to actual chord names
     chord_names = []
     for symbol in progression:
-        # Get the scale degree (Roman numeral)
-        scale_degree = re.sub(r'[^IViv]', '', symbol)
+        # Get the scale degree (Roman numeral) and any modifiers (e.g., 7, maj7, etc.)
+        scale_degree, modifiers = _SYMBOL_PARTS.get(symbol) or _split_symbol(symbol)
         
-        # Get any modifiers (e.g., 7, maj7, etc.)
-        modifiers = re.sub(r'[IViv]', '', symbol)
-        
-        # Determine if it's a major or minor scale
-        scale_mode = 'Major' if scale_type == 'Major' else 'Minor'
-        
-        # Get the semitone offset for this scale degree
-        if scale_degree in SCALE_DEGREE_TO_SEMITONE[scale_mode]:
-            semitone_offset = SCALE_DEGREE_TO_SEMITONE[scale_mode][scale_degree]
-        else:
-            # Default to tonic if scale degree not found
-            semitone_offset = 0
+        # Get the semitone offset for this scale degree, defaulting to the tonic
+        semitone_offset = semitones.get(scale_degree, 0)
         
         # Calculate the root note of the chord
-        root_midi = note_to_midi(root_note, 4) + semitone_offset
-        chord_root, chord_octave = midi_to_note(root_midi)
+        chord_root = _NOTE_NAMES[(root_pc + semitone_offset) % 12]
         
         # Determine chord type based on the symbol
-        if scale_degree.islower():
-            chord_type = 'Minor'
-        elif scale_degree == 'vii' or scale_degree == 'VII' and scale_mode == 'Major':
-            chord_type = 'Diminished'
-        else:
-            chord_type = 'Major'
+        chord_type = base_chord_types.get(scale_degree) or _base_chord_type(scale_degree, scale_mode)
         
         # Add modifiers
         if '7' in modifiers:
-            if chord_type == 'Major':
-                chord_type = 'Dominant 7'
-            elif chord_type == 'Minor':
-                chord_type = 'Minor 7'
-            elif chord_type == 'Diminished':
-                chord_type = 'Diminished 7'
+            chord_type = _SEVENTH_CHORD_TYPES.get(chord_type, chord_type)
         
         # Create chord name
         chord_name = f"{chord_root} {chord_type}"
         chord_names.append(chord_name)
     
-    return chord_names
+    return tuple(chord_names)
 
+@lru_cache(maxsize=512)
 def get_chord_notes(chord_name, scale_str=None):
     """
     Get the notes in a chord.
@@ -262,27 +320,27 @@ def get_chord_notes(chord_name, scale_str=None):
         scale_str (str, optional): Scale string for context
         
     Returns:
-        list: List of notes in the chord
+        tuple: Notes in the chord
     """
-    parts = chord_name.split()
-    if len(parts) < 2:
-        raise ValueError(f"Invalid chord format: {chord_name}. Expected format: 'C Major'")
-    
-    root_note = parts[0]
-    chord_type = ' '.join(parts[1:])
-    
-    if root_note not in NOTE_TO_MIDI:
-        raise ValueError(f"Invalid root note: {root_note}")
-    
-    if chord_type not in CHORD_PATTERNS:
-        raise ValueError(f"Invalid chord type: {chord_type}")
-    
-    root_midi = note_to_midi(root_note, 4)
+    root_note, _, chord_type = chord_name.partition(' ')
+    root_num = NOTE_TO_MIDI.get(root_note)
+    intervals = CHORD_PATTERNS.get(chord_type)
+    if root_num is None or intervals is None:
+        # Not in canonical form, normalize the whitespace
+        root_note, _, chord_type = ' '.join(chord_name.split()).partition(' ')
+        
+        if not chord_type:
+            raise ValueError(f"Invalid chord format: {chord_name}. Expected format: 'C Major'")
+        
+        root_num = NOTE_TO_MIDI.get(root_note)
+        if root_num is None:
+            raise ValueError(f"Invalid root note: {root_note}")
+        
+        intervals = CHORD_PATTERNS.get(chord_type)
+        if intervals is None:
+            raise ValueError(f"Invalid chord type: {chord_type}")
     
-    chord_notes = []
-    for interval in CHORD_PATTERNS[chord_type]:
-        midi_num = root_midi + interval
-        note, octave = midi_to_note(midi_num)
-        chord_notes.append(f"{note}{octave}")
+    # Root in octave 4
+    root_midi = root_num + (4 + 1) * 12
     
-    return chord_notes
\ No newline at end of file
+    return _midi_to_note_names(root_midi, intervals)
\ No newline at end of file
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for serving the AI Music Generator with Gunicorn:
+
+    gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:12000 --timeout 300 --preload wsgi:application
+"""
+
+import logging
+from ui.web_interface import create_app
+
+logging.basicConfig(level=logging.INFO)
+application = create_app()